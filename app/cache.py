@@ -0,0 +1,171 @@
+"""
+In-memory TTL cache with stale-while-revalidate and request coalescing
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from app.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class AsyncTTLCache(Generic[K, V]):
+    """
+    Bounded LRU cache for async lookups.
+
+    - Entries younger than `ttl` are served directly.
+    - Entries younger than `ttl + stale_ttl` are served immediately while a
+      background refresh is started (stale-while-revalidate).
+    - Older entries and misses are fetched; concurrent requests for the same
+      key share a single in-flight fetch (singleflight).
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_size: int, name: str = "cache"):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[K, Tuple[V, float]]" = OrderedDict()
+        self._inflight: Dict[K, asyncio.Future] = {}
+        self._tasks: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, key: K, value: V, age: float = 0.0):
+        """
+        Store a value and evict the least recently used entries beyond max_size.
+        `age` back-dates the entry (e.g. for a value fetched by a previous run).
+        """
+        self._entries[key] = (value, time.monotonic() - age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def peek(self, key: K) -> Optional[V]:
+        """Return the cached value regardless of age, without touching LRU order"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def invalidate(self, key: K):
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    async def get(self, key: K, fetch_many: Callable[[List[K]], Awaitable[Dict[K, V]]]) -> V:
+        """Return a single value, fetching it through fetch_many if needed"""
+        return (await self.get_many([key], fetch_many))[key]
+
+    async def get_many(
+        self,
+        keys: List[K],
+        fetch_many: Callable[[List[K]], Awaitable[Dict[K, V]]],
+        allow_stale: bool = True,
+    ) -> Dict[K, V]:
+        """
+        Return values for all keys. Keys that need fetching are passed to
+        fetch_many in one call, which must return a dict of key -> value.
+        With allow_stale=False, entries past `ttl` are fetched and awaited
+        instead of being served while they revalidate.
+        """
+        now = time.monotonic()
+        result: Dict[K, V] = {}
+        waiting: Dict[K, asyncio.Future] = {}
+        missing: List[K] = []
+        revalidate: List[K] = []
+
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self.hits += 1
+                    CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                    self._entries.move_to_end(key)
+                    result[key] = value
+                    continue
+                if allow_stale and age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    CACHE_LOOKUPS.labels(self.name, "stale").inc()
+                    self._entries.move_to_end(key)
+                    result[key] = value
+                    if key not in self._inflight:
+                        revalidate.append(key)
+                    continue
+
+            if key in self._inflight:
+                self.coalesced += 1
+                CACHE_LOOKUPS.labels(self.name, "coalesced").inc()
+                waiting[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                CACHE_LOOKUPS.labels(self.name, "miss").inc()
+                missing.append(key)
+
+        if revalidate:
+            self._start_fetch(revalidate, fetch_many)
+        if missing:
+            waiting.update(self._start_fetch(missing, fetch_many))
+
+        for key, future in waiting.items():
+            # Shield the shared fetch so one cancelled caller doesn't cancel it for everyone
+            result[key] = await asyncio.shield(future)
+
+        return {key: result[key] for key in keys}
+
+    def _start_fetch(self, keys: List[K], fetch_many) -> Dict[K, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures: Dict[K, asyncio.Future] = {}
+        for key in keys:
+            future = loop.create_future()
+            # Retrieve the exception so unobserved background failures aren't logged as warnings
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            futures[key] = future
+        self._inflight.update(futures)
+
+        async def run():
+            try:
+                values = await fetch_many(list(keys))
+                for key, future in futures.items():
+                    if future.done():
+                        continue
+                    if key in values:
+                        self.set(key, values[key])
+                        future.set_result(values[key])
+                    else:
+                        future.set_exception(KeyError(key))
+            except Exception as e:
+                logger.error(f"Error fetching {len(keys)} cache entries: {e}")
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for key, future in futures.items():
+                    if not future.done():
+                        future.cancel()
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return futures
@@ -0,0 +1,84 @@
+"""
+Circuit breaker for calls to an upstream API
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for {name} is open (retry in {retry_in:.1f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    - closed: calls go through; `failure_threshold` consecutive failures open it.
+    - open: calls fail fast with CircuitOpenError for `reset_timeout` seconds
+      (or until a rate-limit hold set with hold() expires).
+    - half_open: a single probe call is let through; success closes the
+      breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._open_until = 0.0
+        self._probe_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open breaker or rate-limit hold)"""
+        return self.state == self.OPEN or time.monotonic() < self._open_until
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        now = time.monotonic()
+        if self.state == self.CLOSED and now >= self._open_until:
+            return
+        if now < self._open_until:
+            raise CircuitOpenError(self.name, self._open_until - now)
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+        elif now < self._probe_until:
+            # A probe is already in flight
+            raise CircuitOpenError(self.name, self._probe_until - now)
+        # Another probe is allowed if this one never reports back
+        self._probe_until = now + self.reset_timeout
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_until = 0.0
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self.failures} failures, "
+                    f"failing fast for {self.reset_timeout}s"
+                )
+            self.state = self.OPEN
+            self._open_until = time.monotonic() + self.reset_timeout
+
+    def hold(self, seconds: float):
+        """Stop calls for `seconds` without counting a failure (rate limiting)"""
+        self._open_until = max(self._open_until, time.monotonic() + seconds)
@@ -1,8 +1,101 @@
 import os
-from dotenv import load_dotenv
+from dotenv import find_dotenv, load_dotenv
 
-load_dotenv()
+# .env of the working directory (or a parent), not of wherever the package lives
+load_dotenv(find_dotenv(usecwd=True))
 
 DATADOG_API_KEY = os.getenv("DATADOG_API_KEY")
 DATADOG_APP_KEY = os.getenv("DATADOG_APP_KEY")
 DATADOG_API_HOST = os.getenv("DATADOG_API_HOST", "https://api.datadoghq.com")
+
+# HTTP client tuning for Datadog API calls
+DATADOG_TIMEOUT = float(os.getenv("DATADOG_TIMEOUT", "10"))
+DATADOG_HTTP2 = os.getenv("DATADOG_HTTP2", "true").lower() == "true"
+DATADOG_MAX_CONNECTIONS = int(os.getenv("DATADOG_MAX_CONNECTIONS", "20"))
+DATADOG_MAX_CONCURRENCY = int(os.getenv("DATADOG_MAX_CONCURRENCY", "20"))
+DATADOG_REQUEST_DEADLINE = float(os.getenv("DATADOG_REQUEST_DEADLINE", "15"))
+
+# Batch monitor lookups through /api/v1/monitor?monitor_ids=...
+DATADOG_BULK_FETCH = os.getenv("DATADOG_BULK_FETCH", "true").lower() == "true"
+DATADOG_BULK_CHUNK_SIZE = int(os.getenv("DATADOG_BULK_CHUNK_SIZE", "100"))
+
+# Retries (jittered exponential backoff within a time budget) and circuit breaker
+DATADOG_MAX_RETRIES = int(os.getenv("DATADOG_MAX_RETRIES", "2"))
+DATADOG_RETRY_BASE_DELAY = float(os.getenv("DATADOG_RETRY_BASE_DELAY", "0.5"))
+DATADOG_RETRY_BUDGET = float(os.getenv("DATADOG_RETRY_BUDGET", "5"))
+DATADOG_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DATADOG_BREAKER_FAILURE_THRESHOLD", "5"))
+DATADOG_BREAKER_RESET_TIMEOUT = float(os.getenv("DATADOG_BREAKER_RESET_TIMEOUT", "30"))
+
+# Background status poller
+STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", "30"))
+
+# Per-monitor status cache in front of the Datadog client
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "15"))
+STATUS_CACHE_STALE_TTL = float(os.getenv("STATUS_CACHE_STALE_TTL", "60"))
+STATUS_CACHE_MAX_SIZE = int(os.getenv("STATUS_CACHE_MAX_SIZE", "1000"))
+
+# State shared between gunicorn workers on the same host (SQLite file)
+SHARED_STATE_ENABLED = os.getenv("SHARED_STATE_ENABLED", "true").lower() == "true"
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "shared_state.db")
+SHARED_STATE_SYNC_INTERVAL = float(os.getenv("SHARED_STATE_SYNC_INTERVAL", "1"))
+
+# Warm start: the status snapshot saved to disk (periodically and on shutdown) is
+# served by the next start until its first refresh (empty path disables)
+SNAPSHOT_PERSIST_PATH = os.getenv("SNAPSHOT_PERSIST_PATH", "status_snapshot.json")
+SNAPSHOT_PERSIST_INTERVAL = float(os.getenv("SNAPSHOT_PERSIST_INTERVAL", "60"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "3600"))
+
+# Storage backend for monitors and incidents: "sqlite" (default) or "json"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+STORAGE_PATH = os.getenv("STORAGE_PATH", "status_page.db")
+
+# How often each worker checks storage for incident changes made by other workers
+INCIDENTS_VIEW_CHECK_INTERVAL = float(os.getenv("INCIDENTS_VIEW_CHECK_INTERVAL", "1"))
+
+# Incident listing pages (/api/incidents/list) and NDJSON export batches (/api/incidents/export)
+INCIDENTS_PAGE_SIZE = int(os.getenv("INCIDENTS_PAGE_SIZE", "100"))
+INCIDENTS_PAGE_MAX = int(os.getenv("INCIDENTS_PAGE_MAX", "1000"))
+INCIDENTS_EXPORT_BATCH_SIZE = int(os.getenv("INCIDENTS_EXPORT_BATCH_SIZE", "500"))
+
+# Encoded CRUD read responses (lists and single records) kept until storage changes
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "256"))
+
+# HTTP caching of public read endpoints (seconds) and response compression
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "10"))
+HTTP_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", "30"))
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+
+# Server-Sent Events stream (/api/stream)
+STREAM_CHECK_INTERVAL = float(os.getenv("STREAM_CHECK_INTERVAL", "0.5"))
+STREAM_KEEPALIVE_INTERVAL = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", "15"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+
+# Static snapshot publisher (disabled unless a directory is set)
+STATIC_PUBLISH_DIR = os.getenv("STATIC_PUBLISH_DIR", "")
+STATIC_PUBLISH_MAX_AGE = float(os.getenv("STATIC_PUBLISH_MAX_AGE", "30"))
+STATIC_PUBLISH_CHECK_INTERVAL = float(os.getenv("STATIC_PUBLISH_CHECK_INTERVAL", "1"))
+
+# Uptime history (state transitions + hourly/daily rollups in a SQLite file)
+UPTIME_ENABLED = os.getenv("UPTIME_ENABLED", "true").lower() == "true"
+UPTIME_PATH = os.getenv("UPTIME_PATH", "uptime.db")
+UPTIME_MAX_GAP = float(os.getenv("UPTIME_MAX_GAP", "300"))
+UPTIME_TRANSITIONS_RETENTION_DAYS = int(os.getenv("UPTIME_TRANSITIONS_RETENTION_DAYS", "90"))
+UPTIME_HOURLY_RETENTION_DAYS = int(os.getenv("UPTIME_HOURLY_RETENTION_DAYS", "14"))
+UPTIME_DAILY_RETENTION_DAYS = int(os.getenv("UPTIME_DAILY_RETENTION_DAYS", "400"))
+
+# Incidents opened/resolved automatically from Datadog webhooks (and optionally the events API)
+INCIDENT_SYNC_ENABLED = os.getenv("INCIDENT_SYNC_ENABLED", "false").lower() == "true"
+INCIDENT_SYNC_PATH = os.getenv("INCIDENT_SYNC_PATH", "incident_sync.db")
+INCIDENT_SYNC_FLUSH_INTERVAL = float(os.getenv("INCIDENT_SYNC_FLUSH_INTERVAL", "2"))
+INCIDENT_WEBHOOK_TOKEN = os.getenv("INCIDENT_WEBHOOK_TOKEN", "")
+INCIDENT_SYNC_EVENTS_POLL = os.getenv("INCIDENT_SYNC_EVENTS_POLL", "false").lower() == "true"
+INCIDENT_SYNC_EVENTS_INTERVAL = float(os.getenv("INCIDENT_SYNC_EVENTS_INTERVAL", "60"))
+
+# Opt-in request tracing: requests with `X-Profile: <PROFILING_TOKEN>` or a sampled share of
+# requests get a span breakdown; slow ones are kept in a ring buffer (/api/admin/traces)
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", "500"))
+PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "50"))
+PROFILING_PROFILER = os.getenv("PROFILING_PROFILER", "none").lower()
+PROFILING_PATH = os.getenv("PROFILING_PATH", "profiling.db")
@@ -1,12 +1,27 @@
 """
 Helper functions for CRUD operations on JSON files
 """
+import hashlib
 import json
 import os
-from typing import List, Dict, Any
+import shutil
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 from fastapi import HTTPException, status
 import logging
 
+from app.metrics import JSON_FILE_DURATION, JSON_FILE_SIZE
+from app.profiling import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 MONITORS_FILE = "monitors.json"
@@ -21,9 +36,14 @@ def read_json_file(filename: str) -> List[Dict[str, Any]]:
             write_json_file(filename, [])
             return []
 
-        with open(filename, 'r', encoding='utf-8') as f:
+        name = os.path.basename(filename)
+        started = time.perf_counter()
+        with span("json_read", file=name) as attrs, open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            return data if isinstance(data, list) else []
+            size = attrs["bytes"] = os.fstat(f.fileno()).st_size
+        JSON_FILE_DURATION.labels("read", name).observe(time.perf_counter() - started)
+        JSON_FILE_SIZE.labels("read", name).observe(size)
+        return data if isinstance(data, list) else []
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON in {filename}: {e}")
         raise HTTPException(
@@ -39,20 +59,43 @@ def read_json_file(filename: str) -> List[Dict[str, Any]]:
 
 
 def write_json_file(filename: str, data: List[Dict[str, Any]]) -> None:
-    """Write data to a JSON file with backup"""
+    """
+    Write data to a JSON file with backup.
+    The new content is written to a temp file and renamed over the original,
+    so readers never observe a half-written file.
+    """
     try:
-        # Create backup if file exists
-        if os.path.exists(filename):
-            backup_file = f"{filename}.backup"
-            with open(filename, 'r', encoding='utf-8') as f:
-                backup_data = f.read()
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                f.write(backup_data)
-
-        # Write new data
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        name = os.path.basename(filename)
+        started = time.perf_counter()
+
+        with span("json_write", file=name) as attrs:
+            # Create backup if file exists
+            if os.path.exists(filename):
+                shutil.copyfile(filename, f"{filename}.backup")
+
+            # Write new data to a temp file in the same directory
+            directory = os.path.dirname(os.path.abspath(filename))
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                    size = attrs["bytes"] = f.tell()
+                    f.flush()
+                    os.fsync(f.fileno())
+                mode = stat.S_IMODE(os.stat(filename).st_mode) if os.path.exists(filename) else 0o644
+                os.chmod(tmp_path, mode)
+                try:
+                    os.replace(tmp_path, filename)
+                except OSError as e:
+                    # Single-file bind mounts (e.g. docker-compose volumes) can't be renamed over
+                    logger.warning(f"Atomic replace of {filename} failed ({e}), writing in place")
+                    shutil.copyfile(tmp_path, filename)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
 
+        JSON_FILE_DURATION.labels("write", name).observe(time.perf_counter() - started)
+        JSON_FILE_SIZE.labels("write", name).observe(size)
         logger.info(f"Successfully wrote {len(data)} items to {filename}")
     except Exception as e:
         logger.error(f"Error writing to {filename}: {e}")
@@ -62,6 +105,46 @@ def write_json_file(filename: str, data: List[Dict[str, Any]]) -> None:
         )
 
 
+@contextmanager
+def locked_file(filename: str):
+    """
+    Hold an exclusive cross-process lock for a read-modify-write of `filename`.
+    The lock lives in a separate `<filename>.lock` file. Not reentrant.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{filename}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def compute_etag(item: Dict[str, Any]) -> str:
+    """Strong ETag for a stored record, derived from its canonical JSON"""
+    encoded = json.dumps(item, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return f'"{hashlib.sha256(encoded).hexdigest()[:32]}"'
+
+
+def etag_matches(if_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-Match header against the current ETag (None means no precondition)"""
+    if if_match is None:
+        return True
+    # A tag read from a gzipped response names the same record
+    candidates = [c.strip().replace('-gzip"', '"') for c in if_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Convert an ISO 8601 string to an epoch timestamp (None if it can't be parsed)"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
 def reload_monitors_cache():
     """Reload monitors cache in memory"""
     # This will be called after any monitor CRUD operation
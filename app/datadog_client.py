@@ -1,6 +1,18 @@
+import asyncio
+import importlib.util
+import random
+import re
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 import httpx
 from app import config
+from app.cache import AsyncTTLCache
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.metrics import DATADOG_REQUESTS, DATADOG_REQUEST_DURATION
+from app.profiling import span
 import logging
+from typing import Dict, Iterable, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -10,32 +22,385 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-async def get_monitor_status(monitor_id: int):
+# Where a MonitorStatus came from
+SOURCE_LIVE = "live"        # fetched from Datadog just now
+SOURCE_CACHED = "cached"    # Datadog failed, or restored at startup; last known state from an earlier fetch
+SOURCE_ERROR = "error"      # Datadog failed and there is no earlier state
+
+
+@dataclass(frozen=True)
+class MonitorStatus:
+    """
+    Result of a monitor lookup. `fetched_at` is when `state` was fetched from
+    Datadog (for cached results, the time of the last successful fetch), and
+    `error` names what went wrong: not_found, forbidden, http_error, timeout,
+    deadline, circuit_open or unexpected (restored for states saved by a
+    previous run).
+    """
+    state: str
+    fetched_at: float
+    source: str = SOURCE_LIVE
+    error: Optional[str] = None
+
+    @property
+    def age_seconds(self) -> float:
+        return round(max(0.0, time.time() - self.fetched_at), 3)
+
+
+# Shared client, created on app startup and closed on shutdown
+_client: Optional[httpx.AsyncClient] = None
+
+# Per-monitor status cache (TTL + stale-while-revalidate, coalesced fetches)
+status_cache: AsyncTTLCache[int, MonitorStatus] = AsyncTTLCache(
+    ttl=config.STATUS_CACHE_TTL,
+    stale_ttl=config.STATUS_CACHE_STALE_TTL,
+    max_size=config.STATUS_CACHE_MAX_SIZE,
+    name="monitor_status",
+)
+
+# One circuit breaker per Datadog API host
+_breakers: Dict[str, CircuitBreaker] = {}
+
+# Responses worth retrying (rate limited or upstream trouble)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Build a connection-pooled client for the Datadog API"""
+    http2 = config.DATADOG_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        base_url=config.DATADOG_API_HOST,
+        headers={k: v for k, v in HEADERS.items() if v is not None},
+        http2=http2,
+        timeout=config.DATADOG_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=config.DATADOG_MAX_CONNECTIONS,
+            max_keepalive_connections=config.DATADOG_MAX_CONNECTIONS,
+        ),
+    )
+
+
+async def start_client():
+    """Open the shared Datadog client (called from the app startup hook)"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+        logger.info(f"Datadog client started (host: {config.DATADOG_API_HOST})")
+
+
+async def close_client():
+    """Close the shared Datadog client (called from the app shutdown hook)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Datadog client closed")
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily if startup didn't run"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def get_breaker() -> CircuitBreaker:
+    """Return the circuit breaker for the configured Datadog API host"""
+    host = config.DATADOG_API_HOST
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(
+            host,
+            failure_threshold=config.DATADOG_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=config.DATADOG_BREAKER_RESET_TIMEOUT,
+        )
+    return _breakers[host]
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After, else X-RateLimit-Reset)"""
+    value = response.headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset is not None:
+        try:
+            return max(0.0, float(reset))
+        except ValueError:
+            pass
+    return None
+
+
+def _apply_rate_limit(breaker: CircuitBreaker, response: httpx.Response):
+    """Pause calls until the rate limit window resets once it's exhausted"""
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    exhausted = response.status_code == 429 or (remaining is not None and remaining.strip() == "0")
+    if exhausted:
+        delay = _retry_after(response)
+        if delay:
+            logger.warning(f"Datadog rate limit reached, pausing requests for {delay:.0f}s")
+            breaker.hold(delay)
+
+
+def _endpoint(url: str) -> str:
+    """Metrics label for a Datadog URL (/api/v1/monitor/123 -> /api/v1/monitor/{id})"""
+    return re.sub(r"/\d+$", "/{id}", url)
+
+
+async def _get(url: str, params: Optional[dict] = None) -> httpx.Response:
+    """
+    GET through the circuit breaker. Timeouts, connection errors, 429 and 5xx
+    are retried up to DATADOG_MAX_RETRIES times with jittered exponential
+    backoff (or the server's Retry-After), as long as the total time stays
+    within DATADOG_RETRY_BUDGET. Raises CircuitOpenError while the breaker is open.
+    """
+    breaker = get_breaker()
+    endpoint = _endpoint(url)
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            DATADOG_REQUESTS.labels(endpoint, "circuit_open").inc()
+            raise
+        error: Optional[Exception] = None
+        call_started = time.perf_counter()
+        try:
+            with span("datadog", endpoint=endpoint, url=url, params=params, attempt=attempt + 1) as attrs:
+                response = await get_client().get(url, params=params)
+                attrs["status"] = response.status_code
+        except httpx.TransportError as e:
+            DATADOG_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - call_started)
+            outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error"
+            DATADOG_REQUESTS.labels(endpoint, outcome).inc()
+            breaker.record_failure()
+            error = e
+            delay = None
+        except asyncio.CancelledError:
+            # Cancelled by the per-lookup deadline: the upstream is too slow
+            DATADOG_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - call_started)
+            DATADOG_REQUESTS.labels(endpoint, "cancelled").inc()
+            breaker.record_failure()
+            raise
+        else:
+            DATADOG_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - call_started)
+            DATADOG_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+            _apply_rate_limit(breaker, response)
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            if response.status_code != 429:
+                breaker.record_failure()
+            delay = _retry_after(response)
+
+        attempt += 1
+        if delay is None:
+            delay = random.uniform(0, config.DATADOG_RETRY_BASE_DELAY * 2 ** attempt)
+        if attempt > config.DATADOG_MAX_RETRIES or time.monotonic() - started + delay > config.DATADOG_RETRY_BUDGET:
+            if error is not None:
+                raise error
+            return response
+        await asyncio.sleep(delay)
+
+
+def restore_statuses(statuses: Dict[int, MonitorStatus]):
+    """
+    Seed status_cache with states fetched by a previous run, as cached
+    (error="restored") and aged by their `fetched_at`: recent ones are served
+    without calling Datadog, older ones are revalidated, and a failing first
+    refresh falls back to them.
+    """
+    now = time.time()
+    for monitor_id, result in statuses.items():
+        if status_cache.peek(monitor_id) is None:
+            restored = MonitorStatus(result.state, result.fetched_at, SOURCE_CACHED, "restored")
+            status_cache.set(monitor_id, restored, age=max(0.0, now - result.fetched_at))
+
+
+def _fallback_status(monitor_id: int, error: str) -> MonitorStatus:
+    """Last known state of a monitor (source=cached), or "No Data" with source=error if there is none"""
+    previous = status_cache.peek(monitor_id)
+    if previous is not None and previous.source != SOURCE_ERROR:
+        return MonitorStatus(previous.state, previous.fetched_at, SOURCE_CACHED, error)
+    return MonitorStatus("No Data", time.time(), SOURCE_ERROR, error)
+
+
+async def get_monitor_status(monitor_id: int) -> MonitorStatus:
     """
     Fetch monitor status from Datadog API.
-    Returns the overall_state or "No Data" if the monitor doesn't exist or there's an error.
+    Returns the overall_state ("No Data" if the monitor doesn't exist), or the
+    last known state if Datadog can't be reached.
     """
-    url = f"{config.DATADOG_API_HOST}/api/v1/monitor/{monitor_id}"
+    url = f"/api/v1/monitor/{monitor_id}"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=HEADERS)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("overall_state", "No Data")
+        response = await _get(url)
+        response.raise_for_status()
+        data = response.json()
+        return MonitorStatus(data.get("overall_state", "No Data"), time.time())
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             logger.warning(f"Monitor {monitor_id} not found in Datadog")
-            return "No Data"
+            return MonitorStatus("No Data", time.time(), error="not_found")
         elif e.response.status_code == 403:
             logger.error(f"Access forbidden for monitor {monitor_id}. Check API keys.")
-            return "No Data"
+            return _fallback_status(monitor_id, "forbidden")
         else:
             logger.error(f"HTTP error fetching monitor {monitor_id}: {e}")
-            return "No Data"
+            return _fallback_status(monitor_id, "http_error")
+    except CircuitOpenError:
+        return _fallback_status(monitor_id, "circuit_open")
     except httpx.TimeoutException:
         logger.error(f"Timeout fetching monitor {monitor_id}")
-        return "No Data"
+        return _fallback_status(monitor_id, "timeout")
     except Exception as e:
         logger.error(f"Unexpected error fetching monitor {monitor_id}: {e}")
-        return "No Data"
+        return _fallback_status(monitor_id, "unexpected")
+
+
+async def _get_monitor_statuses_individually(monitor_ids: Iterable[int]) -> Dict[int, MonitorStatus]:
+    """
+    Fetch the status of several monitors with one GET per monitor.
+    At most DATADOG_MAX_CONCURRENCY requests are in flight at once, and each
+    lookup is bounded by DATADOG_REQUEST_DEADLINE seconds (waiting for a slot included).
+    """
+    semaphore = asyncio.Semaphore(config.DATADOG_MAX_CONCURRENCY)
+
+    async def fetch(monitor_id: int) -> MonitorStatus:
+        async def limited():
+            async with semaphore:
+                return await get_monitor_status(monitor_id)
+
+        try:
+            return await asyncio.wait_for(limited(), timeout=config.DATADOG_REQUEST_DEADLINE)
+        except asyncio.TimeoutError:
+            logger.error(f"Deadline exceeded fetching monitor {monitor_id}")
+            return _fallback_status(monitor_id, "deadline")
+
+    ids = list(dict.fromkeys(monitor_ids))
+    results = await asyncio.gather(*(fetch(monitor_id) for monitor_id in ids))
+    return dict(zip(ids, results))
+
+
+async def _get_monitor_chunk(monitor_ids: List[int]) -> Dict[int, MonitorStatus]:
+    """
+    Fetch a chunk of monitors through the list endpoint (/api/v1/monitor?monitor_ids=...).
+    Follows pagination until a short page is returned.
+    Returns only the monitors Datadog sent back; an error yields an empty dict.
+    """
+    states: Dict[int, MonitorStatus] = {}
+    page_size = len(monitor_ids)
+    page = 0
+
+    try:
+        while True:
+            response = await _get(
+                "/api/v1/monitor",
+                params={
+                    "monitor_ids": ",".join(str(monitor_id) for monitor_id in monitor_ids),
+                    "page": page,
+                    "page_size": page_size,
+                },
+            )
+            response.raise_for_status()
+            data = response.json()
+            fetched_at = time.time()
+            for monitor in data:
+                if "id" in monitor:
+                    states[int(monitor["id"])] = MonitorStatus(monitor.get("overall_state", "No Data"), fetched_at)
+            if len(data) < page_size or len(states) >= len(monitor_ids):
+                break
+            page += 1
+    except CircuitOpenError:
+        pass
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error fetching monitor batch ({len(monitor_ids)} monitors): {e}")
+    except httpx.TimeoutException:
+        logger.error(f"Timeout fetching monitor batch ({len(monitor_ids)} monitors)")
+    except Exception as e:
+        logger.error(f"Unexpected error fetching monitor batch ({len(monitor_ids)} monitors): {e}")
+
+    return states
+
+
+async def _fetch_monitor_statuses(monitor_ids: Iterable[int]) -> Dict[int, MonitorStatus]:
+    """
+    Fetch the status of several monitors from Datadog.
+    Monitors are resolved in chunks of DATADOG_BULK_CHUNK_SIZE through the list
+    endpoint; any ID missing from the batch results falls back to a per-ID GET.
+    Returns a dict mapping monitor ID to its MonitorStatus.
+    """
+    ids = list(dict.fromkeys(monitor_ids))
+    if not ids:
+        return {}
+    if not config.DATADOG_BULK_FETCH:
+        return await _get_monitor_statuses_individually(ids)
+
+    chunk_size = max(1, config.DATADOG_BULK_CHUNK_SIZE)
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    semaphore = asyncio.Semaphore(config.DATADOG_MAX_CONCURRENCY)
+
+    async def fetch(chunk: List[int]) -> Dict[int, MonitorStatus]:
+        async def limited():
+            async with semaphore:
+                return await _get_monitor_chunk(chunk)
+
+        try:
+            return await asyncio.wait_for(limited(), timeout=config.DATADOG_REQUEST_DEADLINE)
+        except asyncio.TimeoutError:
+            logger.error(f"Deadline exceeded fetching monitor batch ({len(chunk)} monitors)")
+            return {}
+
+    states: Dict[int, MonitorStatus] = {}
+    for result in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+        states.update(result)
+
+    missing = [monitor_id for monitor_id in ids if monitor_id not in states]
+    if missing and get_breaker().is_open:
+        # Don't fan out per-ID requests to an upstream that is failing
+        logger.warning(f"Datadog circuit open or rate limited, serving last known state for {len(missing)} monitors")
+        states.update({monitor_id: _fallback_status(monitor_id, "circuit_open") for monitor_id in missing})
+    elif missing:
+        logger.info(f"{len(missing)} monitors missing from batch results, fetching individually")
+        states.update(await _get_monitor_statuses_individually(missing))
+
+    return {monitor_id: states[monitor_id] for monitor_id in ids}
+
+
+async def get_monitor_statuses(monitor_ids: Iterable[int], allow_stale: bool = True) -> Dict[int, MonitorStatus]:
+    """
+    Return the status of several monitors, served from status_cache when possible.
+    Cache misses are fetched from Datadog in one batch, and concurrent callers
+    asking for the same monitor share the same in-flight request.
+    With allow_stale=False, expired entries are refetched before returning
+    rather than served while they revalidate.
+    Returns a dict mapping monitor ID to its MonitorStatus.
+    """
+    ids = list(dict.fromkeys(monitor_ids))
+    if not ids:
+        return {}
+    return await status_cache.get_many(ids, _fetch_monitor_statuses, allow_stale=allow_stale)
+
+
+async def get_monitor_events(start: int, end: int) -> List[dict]:
+    """
+    Fetch monitor alert events between two epoch timestamps from the events API.
+    Errors propagate, so the caller can retry from the same cursor.
+    """
+    response = await _get(
+        "/api/v1/events",
+        params={"start": start, "end": end, "sources": "alert", "unaggregated": "true"},
+    )
+    response.raise_for_status()
+    return response.json().get("events", [])
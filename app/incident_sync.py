@@ -0,0 +1,425 @@
+"""
+Automatic incidents from Datadog monitor webhooks and the Datadog events API
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.storage import Storage, Upsert
+
+logger = logging.getLogger(__name__)
+
+# Datadog $ALERT_TRANSITION values -> monitor state
+TRANSITIONS = {
+    "Triggered": "Alert",
+    "Re-Triggered": "Alert",
+    "Warn": "Warn",
+    "Re-Warn": "Warn",
+    "Recovered": "OK",
+}
+
+# Datadog alert types ($ALERT_TYPE, events API alert_type) -> monitor state
+ALERT_TYPES = {"error": "Alert", "warning": "Warn", "success": "OK"}
+
+SEVERITIES = {"Alert": "major", "Warn": "minor"}
+TITLES = {"Alert": "Major outage", "Warn": "Degraded performance"}
+
+
+@dataclass(frozen=True)
+class MonitorEvent:
+    """A monitor state change reported by Datadog"""
+    key: str            # idempotency key
+    monitor_id: str     # Datadog monitor ID (url_monitor)
+    state: str          # Alert, Warn or OK
+    at: float           # when the transition happened (epoch seconds)
+    message: str = ""
+
+
+def incident_prefix(monitor_id: str) -> str:
+    """Id prefix of the incidents opened for a monitor (DD-<monitor>-<timestamp>)"""
+    return f"DD-{monitor_id}-"
+
+
+def event_state(transition: Optional[str], alert_type: Optional[str] = None) -> Optional[str]:
+    """Map a Datadog transition / alert type to Alert, Warn or OK (None if it isn't a state change)"""
+    if transition:
+        return TRANSITIONS.get(transition.strip())
+    if alert_type:
+        return ALERT_TYPES.get(alert_type.strip().lower())
+    return None
+
+
+class IncidentSync:
+    """
+    Opens, updates and resolves incidents for configured monitors from
+    Datadog monitor events.
+
+    Accepting an event claims its idempotency key and records it as the
+    monitor's latest event in a SQLite file shared by the workers, in one
+    transaction, so a retried delivery is a duplicate whichever worker
+    receives it. Events are debounced: every flush writes the earliest
+    pending alert and the latest pending event of each monitor in a single
+    storage call, so a burst of webhook deliveries from a flapping monitor
+    costs one write per flush interval, and an alert that recovers before
+    the flush still records its (resolved) incident.
+    Events stay pending until that write succeeds, and the open incident of
+    a monitor is looked up inside the storage transaction, so workers
+    flushing at the same time update the same incident.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        get_monitors: Callable[[], List[Dict[str, Any]]],
+        on_written: Callable[[List[Dict[str, Any]]], None],
+        path: str,
+        flush_interval: float = 2.0,
+        dedupe_size: int = 10000,
+        key_retention_days: int = 7,
+    ):
+        self.storage = storage
+        self._get_monitors = get_monitors
+        self._on_written = on_written
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dedupe_size = dedupe_size
+        self.key_retention = key_retention_days * 86400
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._monitors_ref: Optional[List[Dict[str, Any]]] = None
+        self._monitors_by_id: Dict[str, Dict[str, Any]] = {}
+        self._pruned_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_events ("
+            " key TEXT PRIMARY KEY,"
+            " received_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        # Latest event per monitor; pending until it has been written to storage
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS monitor_events ("
+            " monitor_id TEXT PRIMARY KEY,"
+            " key TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " at REAL NOT NULL,"
+            " message TEXT NOT NULL,"
+            " pending INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_monitor_events_pending ON monitor_events (pending)")
+        # Earliest Alert/Warn event per monitor since its last flush
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS monitor_open_events ("
+            " monitor_id TEXT PRIMARY KEY,"
+            " key TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " at REAL NOT NULL,"
+            " message TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cursors (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        logger.info(f"Incident sync state opened at {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _monitor(self, monitor_id: str) -> Optional[Dict[str, Any]]:
+        monitors = self._get_monitors()
+        if monitors is not self._monitors_ref:
+            self._monitors_by_id = {m["url_monitor"]: m for m in monitors}
+            self._monitors_ref = monitors
+        return self._monitors_by_id.get(monitor_id)
+
+    def _remember(self, key: str):
+        """Cache a key known to be persisted (call with the lock held)"""
+        self._seen[key] = None
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+
+    def submit(self, event: MonitorEvent) -> str:
+        """
+        Accept an event; returns "accepted", "duplicate" or "ignored" (unknown monitor).
+        Blocks on SQLite: call it from a thread in async code.
+        """
+        if self._monitor(event.monitor_id) is None:
+            return "ignored"
+        with self._lock:
+            if event.key in self._seen:
+                return "duplicate"
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                claimed = self._conn.execute(
+                    "INSERT OR IGNORE INTO processed_events (key, received_at) VALUES (?, ?)",
+                    (event.key, time.time()),
+                ).rowcount
+                if claimed:
+                    # Only a newer event replaces the monitor's latest one
+                    latest = self._conn.execute(
+                        "INSERT INTO monitor_events (monitor_id, key, state, at, message, pending)"
+                        " VALUES (?, ?, ?, ?, ?, 1)"
+                        " ON CONFLICT (monitor_id) DO UPDATE SET"
+                        " key = excluded.key, state = excluded.state, at = excluded.at,"
+                        " message = excluded.message, pending = 1"
+                        " WHERE excluded.at >= monitor_events.at",
+                        (event.monitor_id, event.key, event.state, event.at, event.message),
+                    ).rowcount
+                    if latest and event.state != "OK":
+                        # Kept until flushed, so an Alert -> OK pair still opens (and resolves) an incident
+                        self._conn.execute(
+                            "INSERT INTO monitor_open_events (monitor_id, key, state, at, message)"
+                            " VALUES (?, ?, ?, ?, ?)"
+                            " ON CONFLICT (monitor_id) DO NOTHING",
+                            (event.monitor_id, event.key, event.state, event.at, event.message),
+                        )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._remember(event.key)
+        return "accepted" if claimed else "duplicate"
+
+    def _upsert(self, events: List[MonitorEvent], monitor: Dict[str, Any]) -> Upsert:
+        """Apply a monitor's events, oldest first, to its open incident (None if nothing changes)"""
+        def apply(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            changed = False
+            for event in events:
+                incident = self._apply(event, monitor, current)
+                if incident is not None:
+                    current, changed = incident, True
+            return current if changed else None
+
+        return apply
+
+    @staticmethod
+    def _apply(event: MonitorEvent, monitor: Dict[str, Any], current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Apply one event to the open incident `current` (None if it changes nothing)"""
+        timestamp = datetime.fromtimestamp(event.at).isoformat()
+        if current is None:
+            if event.state == "OK":
+                return None
+            return {
+                "id": f"{incident_prefix(event.monitor_id)}{datetime.fromtimestamp(event.at).strftime('%Y%m%d%H%M%S')}",
+                "title": f"{monitor['nome_monitor']} - {TITLES[event.state]}",
+                "status": "investigating",
+                "severity": SEVERITIES[event.state],
+                "created_at": timestamp,
+                "resolved_at": None,
+                "affected_services": [monitor["nome_monitor"]],
+                "updates": [{
+                    "timestamp": timestamp,
+                    "status": "investigating",
+                    "message": event.message or f"Datadog reports {monitor['nome_monitor']} as {event.state}."
+                }]
+            }
+
+        if event.state == "OK":
+            current["status"] = "resolved"
+            current["resolved_at"] = timestamp
+            message = event.message or f"{monitor['nome_monitor']} has recovered."
+        elif current.get("severity") != SEVERITIES[event.state]:
+            current["severity"] = SEVERITIES[event.state]
+            message = event.message or f"{monitor['nome_monitor']}: {TITLES[event.state].lower()}."
+        else:
+            # Same state as the open incident (duplicate delivery or re-notification)
+            return None
+        current.setdefault("updates", []).append({
+            "timestamp": timestamp,
+            "status": current["status"],
+            "message": message
+        })
+        return current
+
+    def write_pending(self) -> List[Dict[str, Any]]:
+        """
+        Write the pending events of every monitor (its earliest alert and its
+        latest event) to storage in one batch and return the incidents
+        written. Events stay pending if the write fails.
+        Blocks on storage: call it from a thread in async code.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT e.key, e.monitor_id, e.state, e.at, e.message, o.key, o.state, o.at, o.message"
+                " FROM monitor_events e LEFT JOIN monitor_open_events o USING (monitor_id)"
+                " WHERE e.pending = 1"
+            ).fetchall()
+        if not rows:
+            return []
+
+        changes = {}
+        for row in rows:
+            event = MonitorEvent(*row[:5])
+            monitor = self._monitor(event.monitor_id)
+            if monitor is None:
+                continue
+            events = [event]
+            if row[5] is not None and row[5] != event.key:
+                events.insert(0, MonitorEvent(row[5], event.monitor_id, *row[6:]))
+            changes[incident_prefix(event.monitor_id)] = self._upsert(events, monitor)
+
+        written = self.storage.upsert_open_incidents(changes) if changes else []
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A newer event received meanwhile (other key) stays pending
+                self._conn.executemany(
+                    "UPDATE monitor_events SET pending = 0 WHERE monitor_id = ? AND key = ?",
+                    [(row[1], row[0]) for row in rows],
+                )
+                self._conn.executemany(
+                    "DELETE FROM monitor_open_events WHERE monitor_id = ? AND key = ?",
+                    [(row[1], row[5]) for row in rows if row[5] is not None],
+                )
+                if now - self._pruned_at >= 3600:
+                    self._conn.execute(
+                        "DELETE FROM processed_events WHERE received_at < ?", (now - self.key_retention,)
+                    )
+                    self._pruned_at = now
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if written:
+            logger.info(f"Incident sync: {len(rows)} monitor events written as {len(written)} incident changes")
+        return written
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        """Write pending events (in a thread) and report the written incidents"""
+        written = await asyncio.to_thread(self.write_pending)
+        if written:
+            self._on_written(written)
+        return written
+
+    def get_cursor(self, name: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, name: str, value: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cursors (name, value) VALUES (?, ?)", (name, value))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing synced incidents (left pending): {e}")
+
+    def start(self):
+        """Start the flush loop (called from the app startup hook)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Incident sync started (flush interval: {self.flush_interval}s)")
+
+    async def stop(self):
+        """Stop the flush loop and write what is still pending (called from the app shutdown hook)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error writing synced incidents (left pending): {e}")
+
+
+class EventsPoller:
+    """
+    Polls the Datadog events API for monitor alerts and feeds them to an
+    IncidentSync. The position is kept as a persisted cursor; each poll
+    re-reads `overlap` seconds before it to catch late events, and the
+    idempotency keys drop the ones already seen.
+    """
+
+    CURSOR = "datadog_events"
+
+    def __init__(
+        self,
+        sync: IncidentSync,
+        fetch_events: Callable[[int, int], Any],
+        interval: float = 60.0,
+        should_poll: Callable[[], bool] = lambda: True,
+        overlap: float = 120.0,
+    ):
+        self.sync = sync
+        self._fetch_events = fetch_events
+        self.interval = interval
+        self._should_poll = should_poll
+        self.overlap = overlap
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll(self) -> int:
+        """Fetch events since the cursor and submit them; returns how many were accepted"""
+        now = time.time()
+        cursor = self.sync.get_cursor(self.CURSOR) or now - self.interval
+        events = await self._fetch_events(int(cursor - self.overlap), int(now))
+        accepted = 0
+        latest = cursor
+        for item in events:
+            state = event_state(None, item.get("alert_type"))
+            monitor_id = item.get("monitor_id")
+            happened = item.get("date_happened")
+            if state is None or monitor_id is None or happened is None:
+                continue
+            event = MonitorEvent(
+                key=f"event:{item['id']}",
+                monitor_id=str(monitor_id),
+                state=state,
+                at=float(happened),
+                message=item.get("title") or "",
+            )
+            if await asyncio.to_thread(self.sync.submit, event) == "accepted":
+                accepted += 1
+            latest = max(latest, float(happened))
+        # Advance even without events, so the next window stays `overlap` + `interval` wide
+        self.sync.set_cursor(self.CURSOR, max(latest, now - self.overlap))
+        return accepted
+
+    async def _run(self):
+        while True:
+            if self._should_poll():
+                try:
+                    await self.poll()
+                except Exception as e:
+                    logger.error(f"Error polling Datadog events: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the polling loop (called from the app startup hook)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Datadog events poller started (interval: {self.interval}s)")
+
+    async def stop(self):
+        """Stop the polling loop (called from the app shutdown hook)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def open_incident_sync(path: str, *args, **kwargs) -> Optional[IncidentSync]:
+    """Open the incident sync state store, or return None (sync disabled) if it can't be opened"""
+    try:
+        return IncidentSync(*args, path=path, **kwargs)
+    except sqlite3.Error as e:
+        logger.error(f"Could not open incident sync state at {path}, incidents will not be synced: {e}")
+        return None
@@ -0,0 +1,155 @@
+"""
+In-memory view of recent incidents with a pre-serialized response body
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.crud_helpers import parse_timestamp
+from app.responses import EncodedBody, encode_json
+
+logger = logging.getLogger(__name__)
+
+
+class RecentIncidentsView:
+    """
+    Incidents created within the last `window_days`, kept in storage order.
+
+    CRUD handlers update the view incrementally (upsert/remove). Changes made
+    by other workers are detected through the storage version, checked at most
+    every `check_interval` seconds. With a version that counts writes (SQLite),
+    the view's own changes don't trigger a reload: when they account for every
+    step since the last load, the view moves to the new version. Entries are dropped as they age out of the
+    window, and the encoded /api/incidents body (with its ETag) is cached until
+    the next change.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], List[Dict[str, Any]]],
+        version: Callable[[], Any],
+        window_days: int = 30,
+        check_interval: float = 1.0,
+    ):
+        self._load = load
+        self._version = version
+        self.window = window_days * 86400
+        self.check_interval = check_interval
+        self._incidents: Dict[str, Dict[str, Any]] = {}
+        self._created: Dict[str, float] = {}
+        self._oldest: Optional[float] = None
+        self._body: Optional[EncodedBody] = None
+        self._changed_at = time.time()
+        self._loaded_version: Any = None
+        self._local_writes = 0
+        self._checked_at = 0.0
+        self._loaded = False
+
+    def _rebuild(self):
+        version = self._version()
+        self._incidents = {}
+        self._created = {}
+        for incident in self._load():
+            self._add(incident)
+        self._recompute_oldest()
+        self._loaded_version = version
+        self._local_writes = 0
+        self._loaded = True
+        self._invalidate_body()
+
+    def _add(self, incident: Dict[str, Any]) -> bool:
+        created = parse_timestamp(incident.get("created_at"))
+        if created is None or created < time.time() - self.window:
+            return False
+        self._incidents[incident["id"]] = incident
+        self._created[incident["id"]] = created
+        return True
+
+    def _recompute_oldest(self):
+        self._oldest = min(self._created.values()) if self._created else None
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        if self._oldest is None or self._oldest >= cutoff:
+            return
+        expired = [incident_id for incident_id, created in self._created.items() if created < cutoff]
+        for incident_id in expired:
+            del self._incidents[incident_id]
+            del self._created[incident_id]
+        self._recompute_oldest()
+        if expired:
+            self._invalidate_body()
+            logger.info(f"Expired {len(expired)} incidents older than the recent window")
+
+    def _refresh(self):
+        now = time.time()
+        if not self._loaded:
+            self._rebuild()
+            self._checked_at = now
+        elif now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._version() != self._loaded_version:
+                self._rebuild()
+        self._expire(now)
+
+    def incidents(self) -> List[Dict[str, Any]]:
+        """Return the recent incidents in storage order"""
+        self._refresh()
+        return list(self._incidents.values())
+
+    def body(self) -> EncodedBody:
+        """Return the encoded {"incidents": [...]} response body"""
+        self._refresh()
+        if self._body is None:
+            self._body = EncodedBody(
+                encode_json({"incidents": list(self._incidents.values())}),
+                last_modified=self._changed_at,
+            )
+        return self._body
+
+    def upsert(self, incident: Dict[str, Any]):
+        """Apply a created or updated incident"""
+        self.upsert_many([incident])
+
+    def upsert_many(self, incidents: List[Dict[str, Any]]):
+        """Apply the incidents written by one storage write"""
+        if not self._loaded or not incidents:
+            return
+        for incident in incidents:
+            incident_id = incident["id"]
+            if self._add(incident):
+                created = self._created[incident_id]
+                self._oldest = created if self._oldest is None else min(self._oldest, created)
+            else:
+                self._incidents.pop(incident_id, None)
+                self._created.pop(incident_id, None)
+        self._invalidate_body()
+        self._applied_write()
+
+    def remove(self, incident_id: str):
+        """Apply a deleted incident"""
+        if not self._loaded:
+            return
+        if self._incidents.pop(incident_id, None) is not None:
+            if self._created.pop(incident_id) == self._oldest:
+                self._recompute_oldest()
+            self._invalidate_body()
+        self._applied_write()
+
+    def _applied_write(self):
+        """Adopt the current version if this process's writes explain every change since the last load"""
+        self._local_writes += 1
+        if not isinstance(self._loaded_version, int):
+            return
+        if self._version() == self._loaded_version + self._local_writes:
+            self._loaded_version += self._local_writes
+            self._local_writes = 0
+
+    def _invalidate_body(self):
+        self._body = None
+        self._changed_at = time.time()
+
+    def invalidate(self):
+        """Force a full reload on the next read"""
+        self._loaded = False
+        self._body = None
@@ -1,18 +1,38 @@
-from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, Response, Depends, Header, HTTPException, Query, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from fastapi.middleware.gzip import GZipMiddleware
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hmac
 import logging
-
-from app.datadog_client import get_monitor_status
+import os
+import time
+
+from app import config
+from app.datadog_client import SOURCE_CACHED, SOURCE_ERROR, SOURCE_LIVE, start_client, close_client, get_monitor_events
+from app import metrics
+from app.profiling import ProfilingMiddleware, TraceStore, span
+from app.poller import StatusPoller
+from app.shared_state import open_shared_state
+from app.storage import (
+    create_storage, decode_cursor, encode_cursor, incident_key, ConflictError, IncidentFilter, PreconditionFailedError
+)
+from app.crud_helpers import compute_etag
+from app.incidents_view import RecentIncidentsView
+from app.stream import StatusStream, KEEPALIVE
+from app.publisher import StaticPublisher, summary_document
+from app.uptime import open_uptime_store, uptime_percent, COLUMNS
+from app.incident_sync import EventsPoller, MonitorEvent, event_state, open_incident_sync
+from app.responses import (
+    EncodedBody, VersionedCache, cache_headers, encode_json, encoded_response, is_not_modified,
+    not_modified_response
+)
 from app.models import (
-    MonitorCreate, MonitorUpdate, MonitorResponse,
-    IncidentCreate, IncidentUpdateModel, IncidentResponse, AddIncidentUpdate
+    MonitorCreate, MonitorUpdate, MonitorResponse, UptimeResponse, UptimeSummaryResponse,
+    IncidentCreate, IncidentUpdateModel, IncidentResponse, AddIncidentUpdate, DatadogWebhook
 )
-import json
-import os
-from typing import List
+from typing import List, Literal, Optional
 
 # Configure logging
 logging.basicConfig(
@@ -30,201 +50,486 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "Link", "X-Next-Cursor"],
 )
 
-templates = Jinja2Templates(directory="app/templates")
+# Compress large responses (pre-encoded bodies arrive already gzipped)
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MINIMUM_SIZE)
+
+# Opt-in request tracing (X-Profile header or sampling), slow traces kept for /api/admin/traces
+trace_store = TraceStore(config.PROFILING_PATH, config.PROFILING_BUFFER_SIZE) \
+    if config.PROFILING_TOKEN or config.PROFILING_SAMPLE_RATE > 0 else None
+if trace_store is not None:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=trace_store,
+        token=config.PROFILING_TOKEN,
+        sample_rate=config.PROFILING_SAMPLE_RATE,
+        slow_ms=config.PROFILING_SLOW_MS,
+        profiler=config.PROFILING_PROFILER,
+        exclude=("/api/admin/traces", "/api/stream", "/metrics"),
+    )
+
+# Request latency per route and in-flight requests (outermost, so it times everything)
+app.add_middleware(metrics.MetricsMiddleware, exclude=("/api/stream",))
+
+# Jinja2 is only needed by the legacy page and the static publisher: loaded on first use
+_templates = None
+
+def get_templates():
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
+    return _templates
+
+def warm_templates():
+    """Import Jinja2 and compile the status page off the request path"""
+    get_templates().get_template("status.html")
+
+# Storage backend for monitors and incidents (SQLite by default)
+storage = create_storage()
 
-# Carrega monitores do JSON
+# Carrega monitores do storage
 try:
-    with open("monitors.json", "r") as f:
-        MONITORES = json.load(f)
-        logger.info(f"Loaded {len(MONITORES)} monitors from monitors.json")
-except FileNotFoundError:
-    logger.error("monitors.json not found! Please create this file.")
-    MONITORES = []
-except json.JSONDecodeError as e:
-    logger.error(f"Invalid JSON in monitors.json: {e}")
+    MONITORES = storage.list_monitors()
+    logger.info(f"Loaded {len(MONITORES)} monitors from storage")
+except Exception as e:
+    logger.error(f"Error loading monitors: {e}")
     MONITORES = []
 
-# Carrega incidentes do JSON (com fallback caso não exista)
+def set_monitors(monitors):
+    """Replace the in-memory monitor list (used when another worker changes it)"""
+    global MONITORES
+    MONITORES = monitors
+
+# Uptime history, opened on startup when UPTIME_ENABLED
+uptime = None
+
+def record_uptime(states):
+    """Add the states fetched by the poller to the uptime history"""
+    if uptime is not None:
+        # A state served from cache (Datadog unreachable) is not a known state
+        uptime.record({
+            monitor_id: result.state if result.source == SOURCE_LIVE else "No Data"
+            for monitor_id, result in states.items()
+        })
+
+def uptime_version():
+    """
+    Write counters of the uptime history and of storage: the same on every
+    connection, so the cache can be checked from any worker thread
+    """
+    return (uptime.version() if uptime is not None else None), storage.version()
+
+# Encoded uptime responses, reused until the history changes
+uptime_cache = VersionedCache(uptime_version, max_entries=config.READ_CACHE_SIZE, name="uptime")
+
+def uptime_history(monitor_ids: List[int], days: int, resolution: str):
+    """Overall uptime and buckets of each monitor for the last `days` days"""
+    count = days if resolution == "day" else days * 24
+    history = {}
+    for monitor_id, buckets in uptime.buckets_many(monitor_ids, count, resolution).items():
+        totals = {column: sum(b["seconds"][column] for b in buckets) for column in COLUMNS}
+        history[monitor_id] = {"uptime_percent": uptime_percent(totals), "buckets": buckets}
+    return history
+
+async def cached_uptime(key, build) -> Optional[EncodedBody]:
+    """
+    Encoded uptime response for `key`, built off the event loop. The current
+    hour is part of the key so the newest bucket rolls over even without polls.
+    """
+    if uptime is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Uptime history is disabled"
+        )
+    return await asyncio.to_thread(uptime_cache.get, (*key, int(time.time() // 3600)), build)
+
+def check_uptime_window(days: int, resolution: str):
+    if resolution == "hour" and days > config.UPTIME_HOURLY_RETENTION_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hourly uptime is kept for {config.UPTIME_HOURLY_RETENTION_DAYS} days"
+        )
+
+# Background poller serving monitor states from an in-memory snapshot
+poller = StatusPoller(
+    lambda: MONITORES,
+    config.STATUS_POLL_INTERVAL,
+    set_monitors=set_monitors,
+    sync_interval=config.SHARED_STATE_SYNC_INTERVAL,
+    on_refresh=record_uptime,
+    persist_path=config.SNAPSHOT_PERSIST_PATH,
+    persist_interval=config.SNAPSHOT_PERSIST_INTERVAL,
+)
+
+# Carrega incidentes recentes do storage
 def load_incidents():
     try:
-        with open("incidents.json", "r") as f:
-            incidents = json.load(f)
-            # Filter last 30 days
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            filtered = [
-                inc for inc in incidents
-                if datetime.fromisoformat(inc["created_at"]) >= thirty_days_ago
-            ]
-            logger.info(f"Loaded {len(filtered)} recent incidents (out of {len(incidents)} total)")
-            return filtered
-    except FileNotFoundError:
-        logger.info("incidents.json not found - no incidents will be displayed")
-        return []
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in incidents.json: {e}")
-        return []
+        # Filter last 30 days
+        thirty_days_ago = datetime.now() - timedelta(days=30)
+        with span("load_incidents") as attrs:
+            filtered = storage.list_incidents_since(thirty_days_ago)
+            attrs["incidents"] = len(filtered)
+        logger.info(f"Loaded {len(filtered)} recent incidents")
+        return filtered
     except Exception as e:
         logger.error(f"Error loading incidents: {e}")
         return []
 
+# Recent incidents served from memory, kept up to date by the CRUD handlers
+recent_incidents = RecentIncidentsView(
+    load_incidents,
+    storage.incidents_version,
+    window_days=30,
+    check_interval=config.INCIDENTS_VIEW_CHECK_INTERVAL,
+)
+
+# Encoded CRUD read responses, reused until storage changes
+read_cache = VersionedCache(storage.version, max_entries=config.READ_CACHE_SIZE, name="crud_reads")
+
+# Stored records were validated on write: reads only pick the response model's fields
+MONITOR_FIELDS = tuple(MonitorResponse.model_fields)
+INCIDENT_FIELDS = tuple(IncidentResponse.model_fields)
+
+def as_response(item, fields):
+    """Shape a stored record like its response model without re-validating it"""
+    return {field: item.get(field) for field in fields}
+
+# Server-Sent Events fan-out of monitor and incident changes
+status_stream = StatusStream(
+    poller,
+    recent_incidents,
+    check_interval=config.STREAM_CHECK_INTERVAL,
+    queue_size=config.STREAM_QUEUE_SIZE,
+)
+
+def render_status_page(snapshot) -> str:
+    """Render the legacy status page outside of a request (static publisher)"""
+    return get_templates().get_template("status.html").render(
+        monitores=snapshot.page_monitors,
+        updated_at=datetime.fromtimestamp(snapshot.fetched_at, tz=timezone.utc)
+    )
+
+# Writes the page and API documents to disk when STATIC_PUBLISH_DIR is set
+publisher = StaticPublisher(
+    poller,
+    recent_incidents,
+    render_status_page,
+    config.STATIC_PUBLISH_DIR,
+    max_age=config.STATIC_PUBLISH_MAX_AGE,
+    check_interval=config.STATIC_PUBLISH_CHECK_INTERVAL,
+) if config.STATIC_PUBLISH_DIR else None
+
+# Incidents opened/resolved from Datadog events, set up on startup when INCIDENT_SYNC_ENABLED
+incident_sync = None
+events_poller = None
+
+def incidents_synced(incidents):
+    """Apply incidents written by the incident sync to the recent incidents view"""
+    recent_incidents.upsert_many(incidents)
+    read_cache.invalidate()
+    status_stream.notify()
+
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Status Page API starting up...")
-    logger.info(f"Monitors configured: {len(MONITORES)}")
-    if MONITORES:
-        for monitor in MONITORES:
-            logger.info(f"  - {monitor['nome_monitor']} (ID: {monitor['url_monitor']})")
+    global uptime, incident_sync, events_poller
+    logger.info(f"Status Page API starting up ({len(MONITORES)} monitors configured)")
+    for monitor in MONITORES:
+        logger.debug(f"  - {monitor['nome_monitor']} (ID: {monitor['url_monitor']})")
+    asyncio.get_running_loop().run_in_executor(None, warm_templates)
+    await start_client()
+    if config.UPTIME_ENABLED:
+        uptime = open_uptime_store(
+            config.UPTIME_PATH,
+            max_gap=config.UPTIME_MAX_GAP,
+            transitions_retention_days=config.UPTIME_TRANSITIONS_RETENTION_DAYS,
+            hourly_retention_days=config.UPTIME_HOURLY_RETENTION_DAYS,
+            daily_retention_days=config.UPTIME_DAILY_RETENTION_DAYS,
+        )
+    if config.SHARED_STATE_ENABLED:
+        # Opened per worker (not at import) so forked workers don't share a connection
+        poller.shared = open_shared_state(config.SHARED_STATE_PATH)
+        poller.seed_monitors(MONITORES)
+    poller.warm_start(config.SNAPSHOT_MAX_AGE)
+    poller.start()
+    status_stream.start()
+    if publisher is not None:
+        publisher.start()
+    if config.INCIDENT_SYNC_ENABLED:
+        incident_sync = open_incident_sync(
+            config.INCIDENT_SYNC_PATH,
+            storage,
+            lambda: MONITORES,
+            incidents_synced,
+            flush_interval=config.INCIDENT_SYNC_FLUSH_INTERVAL,
+        )
+        if incident_sync is not None:
+            incident_sync.start()
+            if config.INCIDENT_SYNC_EVENTS_POLL:
+                # Only the worker polling Datadog for states also polls events
+                events_poller = EventsPoller(
+                    incident_sync,
+                    get_monitor_events,
+                    interval=config.INCIDENT_SYNC_EVENTS_INTERVAL,
+                    should_poll=lambda: poller.shared is None or poller.leader,
+                )
+                events_poller.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Status Page API shutting down...")
+    if events_poller is not None:
+        await events_poller.stop()
+    if incident_sync is not None:
+        await incident_sync.stop()
+        incident_sync.close()
+    if publisher is not None:
+        await publisher.stop()
+    await status_stream.stop()
+    await poller.stop()
+    await close_client()
+    if trace_store is not None:
+        trace_store.close()
+    if poller.shared is not None:
+        poller.shared.close()
+    if uptime is not None:
+        uptime.close()
 
 @app.get("/", response_class=HTMLResponse)
 async def status_page(request: Request):
-    monitores_info = []
-    for monitor in MONITORES:
-        monitor_id = int(monitor["url_monitor"])
-        estado = await get_monitor_status(monitor_id)
-
-        monitores_info.append({
-            "nome_monitor": monitor["nome_monitor"],
-            "descricao_monitor": monitor["descricao_monitor"],
-            "estado": estado
-        })
+    snapshot = await poller.get_snapshot()
+    if is_not_modified(request, snapshot.validator, snapshot.last_modified):
+        return not_modified_response(snapshot.validator, snapshot.last_modified)
 
-    return templates.TemplateResponse("status.html", {
-        "request": request,
-        "monitores": monitores_info
-    })
+    with span("render", template="status.html"):
+        return get_templates().TemplateResponse(request, "status.html", {
+            "monitores": snapshot.page_monitors,
+            "updated_at": datetime.fromtimestamp(snapshot.fetched_at, tz=timezone.utc)
+        }, headers=cache_headers(snapshot.validator, snapshot.last_modified))
 
 @app.get("/api/monitors")
-async def get_monitors():
+async def get_monitors(request: Request, response: Response):
     """API endpoint to get all monitor statuses"""
-    monitores_info = []
-    for monitor in MONITORES:
-        monitor_id = int(monitor["url_monitor"])
-        estado = await get_monitor_status(monitor_id)
-
-        monitores_info.append({
-            "id": monitor_id,
-            "name": monitor["nome_monitor"],
-            "description": monitor["descricao_monitor"],
-            "status": estado
-        })
+    snapshot = await poller.get_snapshot()
+    if is_not_modified(request, snapshot.validator, snapshot.last_modified):
+        return not_modified_response(snapshot.validator, snapshot.last_modified)
+    response.headers.update(cache_headers(snapshot.validator, snapshot.last_modified))
 
-    return {"monitors": monitores_info}
+    return {
+        "monitors": snapshot.monitors,
+        "updated_at": snapshot.updated_at,
+        "snapshot_age_seconds": snapshot.age_seconds
+    }
 
 @app.get("/api/incidents")
-async def get_incidents():
+async def get_incidents(request: Request):
     """API endpoint to get recent incidents (last 30 days)"""
-    incidents = load_incidents()
-    return {"incidents": incidents}
+    return encoded_response(request, recent_incidents.body())
 
 @app.get("/api/status")
-async def get_overall_status():
+async def get_overall_status(request: Request, response: Response):
     """API endpoint to get overall system status"""
-    monitores_info = []
-    for monitor in MONITORES:
-        monitor_id = int(monitor["url_monitor"])
-        estado = await get_monitor_status(monitor_id)
-        monitores_info.append(estado)
-
-    # Filter out "No Data" and "Skipped" for status calculation
-    # These are informational, not failures
-    active_statuses = [
-        status for status in monitores_info
-        if status not in ["No Data", "Skipped"]
-    ]
-
-    # Determine overall status based on active monitors
-    if not active_statuses:
-        # All monitors are "No Data" or "Skipped"
-        overall = "unknown"
-    elif any(status == "Alert" for status in active_statuses):
-        # At least one monitor is in alert state
-        overall = "major_outage"
-    elif any(status == "Warn" for status in active_statuses):
-        # At least one monitor is in warning state
-        overall = "partial_outage"
-    elif all(status == "OK" for status in active_statuses):
-        # All active monitors are OK
-        overall = "operational"
-    else:
-        # Unexpected status
-        overall = "unknown"
+    snapshot = await poller.get_snapshot()
+    if is_not_modified(request, snapshot.validator, snapshot.last_modified):
+        return not_modified_response(snapshot.validator, snapshot.last_modified)
+    response.headers.update(cache_headers(snapshot.validator, snapshot.last_modified))
 
     return {
-        "status": overall,
-        "updated_at": datetime.now().isoformat()
+        "status": snapshot.overall,
+        "updated_at": snapshot.updated_at,
+        "snapshot_age_seconds": snapshot.age_seconds,
+        "stale_monitors": snapshot.stale_monitors,
+        "failed_monitors": snapshot.failed_monitors
     }
 
+# Encoded /api/summary body, reused until the snapshot or the incidents change
+_summary_key = None
+_summary_body: Optional[EncodedBody] = None
+
+def summary_body(snapshot) -> EncodedBody:
+    """Encode monitors, overall status and recent incidents from one snapshot"""
+    global _summary_key, _summary_body
+    incidents = recent_incidents.body()
+    key = (snapshot.fetched_at, snapshot.etag, incidents.etag)
+    if key != _summary_key:
+        # The ETag is a hash of the body, which includes the fetch time
+        _summary_body = EncodedBody(
+            encode_json(summary_document(snapshot, recent_incidents.incidents())),
+            last_modified=max(snapshot.last_modified, incidents.last_modified)
+        )
+        _summary_key = key
+    return _summary_body
+
+@app.get("/api/summary")
+async def get_summary(request: Request):
+    """API endpoint to get monitors, overall status and recent incidents in one response"""
+    snapshot = await poller.get_snapshot()
+    return encoded_response(request, summary_body(snapshot))
+
+@app.get("/api/uptime", response_model=UptimeSummaryResponse)
+async def get_uptime(
+    request: Request,
+    days: int = Query(90, ge=1, le=config.UPTIME_DAILY_RETENTION_DAYS),
+    resolution: Literal["day", "hour"] = "day"
+):
+    """Uptime history of every monitor on the status page, for the uptime bars"""
+    check_uptime_window(days, resolution)
+    snapshot = await poller.get_snapshot()
+    monitor_ids = [m["id"] for m in snapshot.monitors]
+
+    def build():
+        history = uptime_history(monitor_ids, days, resolution)
+        return EncodedBody(encode_json({
+            "resolution": resolution,
+            "days": days,
+            "monitors": [{"id": monitor_id, **history[monitor_id]} for monitor_id in monitor_ids]
+        }))
+
+    encoded = await cached_uptime(("all", tuple(monitor_ids), days, resolution), build)
+    return encoded_response(request, encoded)
+
+@app.get("/api/stream")
+async def stream_status(request: Request):
+    """
+    Server-Sent Events stream: a `snapshot` event with monitors, status and
+    recent incidents on connect, then `monitor`, `monitor_deleted`, `status`,
+    `incident` and `incident_deleted` events as things change.
+    """
+    initial = await status_stream.initial_event()
+    queue = status_stream.subscribe()
+
+    async def events():
+        try:
+            yield initial
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=config.STREAM_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                if payload is None:
+                    break
+                yield payload
+        finally:
+            status_stream.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 # ============================================================================
 # CRUD ENDPOINTS FOR MONITORS
 # ============================================================================
 
-from app.crud_helpers import read_json_file, write_json_file, MONITORS_FILE, INCIDENTS_FILE
-
 @app.get("/api/monitors/list", response_model=List[MonitorResponse], tags=["Monitors"])
-async def list_monitors():
+async def list_monitors(request: Request):
     """Get all configured monitors (CRUD endpoint)"""
-    monitors = read_json_file(MONITORS_FILE)
-    return monitors
+    encoded = read_cache.get("monitors", lambda: EncodedBody(encode_json(
+        [as_response(m, MONITOR_FIELDS) for m in storage.list_monitors()]
+    )))
+    return encoded_response(request, encoded, public=False)
 
 @app.post("/api/monitors", response_model=MonitorResponse, status_code=status.HTTP_201_CREATED, tags=["Monitors"])
 async def create_monitor(monitor: MonitorCreate):
     """Create a new monitor"""
-    monitors = read_json_file(MONITORS_FILE)
-    
-    # Check if monitor ID already exists
-    for existing in monitors:
-        if existing.get("url_monitor") == monitor.url_monitor:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Monitor with ID {monitor.url_monitor} already exists"
-            )
-    
-    # Add new monitor
-    new_monitor = monitor.model_dump()
-    monitors.append(new_monitor)
-    write_json_file(MONITORS_FILE, monitors)
+    try:
+        new_monitor = await asyncio.to_thread(storage.create_monitor, monitor.model_dump())
+    except ConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Monitor with ID {monitor.url_monitor} already exists"
+        )
     
     # Reload global cache
     global MONITORES
-    MONITORES = monitors
+    MONITORES = await asyncio.to_thread(storage.list_monitors)
+    read_cache.invalidate()
+    await poller.publish_monitors(MONITORES)
     
     logger.info(f"Created monitor: {monitor.nome_monitor} (ID: {monitor.url_monitor})")
     return new_monitor
 
+def encode_record(item, fields):
+    """Encoded record whose ETag is the one If-Match is checked against"""
+    if item is None:
+        return None
+    return EncodedBody(encode_json(as_response(item, fields)), etag=compute_etag(item))
+
 @app.get("/api/monitors/{monitor_id}", response_model=MonitorResponse, tags=["Monitors"])
-async def get_monitor(monitor_id: str):
-    """Get a specific monitor by ID"""
-    monitors = read_json_file(MONITORS_FILE)
-    
-    for monitor in monitors:
-        if monitor.get("url_monitor") == monitor_id:
-            return monitor
+async def get_monitor(monitor_id: str, request: Request):
+    """Get a specific monitor by ID (the ETag header can be sent back as If-Match on PUT)"""
+    encoded = read_cache.get(
+        ("monitor", monitor_id), lambda: encode_record(storage.get_monitor(monitor_id), MONITOR_FIELDS)
+    )
+    if encoded is not None:
+        return encoded_response(request, encoded, public=False)
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail=f"Monitor {monitor_id} not found"
     )
 
+@app.get("/api/monitors/{monitor_id}/uptime", response_model=UptimeResponse, tags=["Monitors"])
+async def get_monitor_uptime(
+    monitor_id: str,
+    request: Request,
+    days: int = Query(90, ge=1, le=config.UPTIME_DAILY_RETENTION_DAYS),
+    resolution: Literal["day", "hour"] = "day"
+):
+    """Uptime history of a monitor: one bucket per day (or hour) for the last `days` days"""
+    check_uptime_window(days, resolution)
+
+    def build():
+        monitor = storage.get_monitor(monitor_id)
+        if monitor is None:
+            return None
+        history = uptime_history([int(monitor["url_monitor"])], days, resolution)[int(monitor["url_monitor"])]
+        return EncodedBody(encode_json({"monitor": monitor, "resolution": resolution, **history}))
+
+    encoded = await cached_uptime(("monitor", monitor_id, days, resolution), build)
+    if encoded is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Monitor {monitor_id} not found"
+        )
+    return encoded_response(request, encoded)
+
 @app.put("/api/monitors/{monitor_id}", response_model=MonitorResponse, tags=["Monitors"])
-async def update_monitor(monitor_id: str, monitor_update: MonitorUpdate):
-    """Update an existing monitor"""
-    monitors = read_json_file(MONITORS_FILE)
+async def update_monitor(
+    monitor_id: str,
+    monitor_update: MonitorUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """Update an existing monitor (optionally conditional on If-Match)"""
+    # Update only provided fields
+    update_data = monitor_update.model_dump(exclude_unset=True)
+    try:
+        monitor = await asyncio.to_thread(storage.update_monitor, monitor_id, update_data, if_match=if_match)
+    except ConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Monitor with ID {update_data.get('url_monitor')} already exists"
+        )
+    except PreconditionFailedError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Monitor {monitor_id} was modified by another request"
+        )
     
-    for i, monitor in enumerate(monitors):
-        if monitor.get("url_monitor") == monitor_id:
-            # Update only provided fields
-            update_data = monitor_update.model_dump(exclude_unset=True)
-            monitors[i].update(update_data)
-            write_json_file(MONITORS_FILE, monitors)
-            
-            # Reload global cache
-            global MONITORES
-            MONITORES = monitors
-            
-            logger.info(f"Updated monitor: {monitor_id}")
-            return monitors[i]
+    if monitor is not None:
+        response.headers["ETag"] = compute_etag(monitor)
+        # Reload global cache
+        global MONITORES
+        MONITORES = await asyncio.to_thread(storage.list_monitors)
+        read_cache.invalidate()
+        await poller.publish_monitors(MONITORES)
+        
+        logger.info(f"Updated monitor: {monitor_id}")
+        return monitor
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -234,19 +539,15 @@ async def update_monitor(monitor_id: str, monitor_update: MonitorUpdate):
 @app.delete("/api/monitors/{monitor_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Monitors"])
 async def delete_monitor(monitor_id: str):
     """Delete a monitor"""
-    monitors = read_json_file(MONITORS_FILE)
-    
-    for i, monitor in enumerate(monitors):
-        if monitor.get("url_monitor") == monitor_id:
-            deleted = monitors.pop(i)
-            write_json_file(MONITORS_FILE, monitors)
-            
-            # Reload global cache
-            global MONITORES
-            MONITORES = monitors
-            
-            logger.info(f"Deleted monitor: {monitor_id}")
-            return
+    if await asyncio.to_thread(storage.delete_monitor, monitor_id):
+        # Reload global cache
+        global MONITORES
+        MONITORES = await asyncio.to_thread(storage.list_monitors)
+        read_cache.invalidate()
+        await poller.publish_monitors(MONITORES)
+        
+        logger.info(f"Deleted monitor: {monitor_id}")
+        return
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -258,41 +559,103 @@ async def delete_monitor(monitor_id: str):
 # CRUD ENDPOINTS FOR INCIDENTS
 # ============================================================================
 
+IncidentStatus = Literal["investigating", "identified", "monitoring", "resolved"]
+IncidentSeverity = Literal["minor", "major", "critical"]
+
+def incident_filters(
+    status_filter: Optional[List[IncidentStatus]] = Query(None, alias="status", description="Repeat to match any of several"),
+    severity: Optional[List[IncidentSeverity]] = Query(None, description="Repeat to match any of several"),
+    service: Optional[str] = Query(None, description="Affected service"),
+    since: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Created before (ISO 8601)")
+) -> IncidentFilter:
+    """Filters shared by the incident listing and export"""
+    return IncidentFilter(
+        status=tuple(status_filter) if status_filter else None,
+        severity=tuple(severity) if severity else None,
+        service=service,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None
+    )
+
 @app.get("/api/incidents/list", response_model=List[IncidentResponse], tags=["Incidents"])
-async def list_all_incidents():
-    """Get all incidents (including those older than 30 days)"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    return incidents
+async def list_all_incidents(
+    request: Request,
+    filters: IncidentFilter = Depends(incident_filters),
+    limit: int = Query(config.INCIDENTS_PAGE_SIZE, ge=1, le=config.INCIDENTS_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """
+    Get incidents (including those older than 30 days), newest first, one page
+    at a time. When more remain, the X-Next-Cursor header holds the cursor of
+    the next page and the Link header its URL.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    def build():
+        # One extra row tells whether there is a next page
+        page = storage.page_incidents(filters, after, limit + 1)
+        next_cursor = encode_cursor(incident_key(page[limit - 1])) if len(page) > limit else None
+        return EncodedBody(encode_json([as_response(i, INCIDENT_FIELDS) for i in page[:limit]])), next_cursor
+
+    encoded, next_cursor = read_cache.get(("incidents", filters, after, limit), build)
+    response = encoded_response(request, encoded, public=False)
+    if next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url.path}?{next_url.query}>; rel="next"'
+    return response
+
+@app.get(
+    "/api/incidents/export",
+    tags=["Incidents"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "One incident per line, newest first"}}
+)
+async def export_incidents(filters: IncidentFilter = Depends(incident_filters)):
+    """
+    Stream every incident matching the filters as NDJSON. Incidents are read
+    from storage in batches and written as stored, so the whole history is
+    never held in memory. Each batch is one chunk, so the response makes one
+    threadpool hop per batch rather than per line.
+    """
+    return StreamingResponse(
+        storage.iter_incidents_ndjson(filters, config.INCIDENTS_EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="incidents.ndjson"'}
+    )
 
 @app.post("/api/incidents", response_model=IncidentResponse, status_code=status.HTTP_201_CREATED, tags=["Incidents"])
 async def create_incident(incident: IncidentCreate):
     """Create a new incident"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    
-    # Check if incident ID already exists
-    for existing in incidents:
-        if existing.get("id") == incident.id:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Incident {incident.id} already exists"
-            )
-    
-    # Add new incident
-    new_incident = incident.model_dump()
-    incidents.append(new_incident)
-    write_json_file(INCIDENTS_FILE, incidents)
+    try:
+        new_incident = await asyncio.to_thread(storage.create_incident, incident.model_dump())
+    except ConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Incident {incident.id} already exists"
+        )
     
+    recent_incidents.upsert(new_incident)
+    read_cache.invalidate()
+    status_stream.notify()
     logger.info(f"Created incident: {incident.id} - {incident.title}")
     return new_incident
 
 @app.get("/api/incidents/{incident_id}", response_model=IncidentResponse, tags=["Incidents"])
-async def get_incident(incident_id: str):
-    """Get a specific incident by ID"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    
-    for incident in incidents:
-        if incident.get("id") == incident_id:
-            return incident
+async def get_incident(incident_id: str, request: Request):
+    """Get a specific incident by ID (the ETag header can be sent back as If-Match on PUT)"""
+    encoded = read_cache.get(
+        ("incident", incident_id), lambda: encode_record(storage.get_incident(incident_id), INCIDENT_FIELDS)
+    )
+    if encoded is not None:
+        return encoded_response(request, encoded, public=False)
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -300,19 +663,29 @@ async def get_incident(incident_id: str):
     )
 
 @app.put("/api/incidents/{incident_id}", response_model=IncidentResponse, tags=["Incidents"])
-async def update_incident(incident_id: str, incident_update: IncidentUpdateModel):
-    """Update an existing incident"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    
-    for i, incident in enumerate(incidents):
-        if incident.get("id") == incident_id:
-            # Update only provided fields
-            update_data = incident_update.model_dump(exclude_unset=True)
-            incidents[i].update(update_data)
-            write_json_file(INCIDENTS_FILE, incidents)
-            
-            logger.info(f"Updated incident: {incident_id}")
-            return incidents[i]
+async def update_incident(
+    incident_id: str,
+    incident_update: IncidentUpdateModel,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """Update an existing incident (optionally conditional on If-Match)"""
+    # Update only provided fields
+    update_data = incident_update.model_dump(exclude_unset=True)
+    try:
+        incident = await asyncio.to_thread(storage.update_incident, incident_id, update_data, if_match=if_match)
+    except PreconditionFailedError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Incident {incident_id} was modified by another request"
+        )
+    if incident is not None:
+        response.headers["ETag"] = compute_etag(incident)
+        recent_incidents.upsert(incident)
+        read_cache.invalidate()
+        status_stream.notify()
+        logger.info(f"Updated incident: {incident_id}")
+        return incident
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -322,30 +695,30 @@ async def update_incident(incident_id: str, incident_update: IncidentUpdateModel
 @app.post("/api/incidents/{incident_id}/updates", response_model=IncidentResponse, tags=["Incidents"])
 async def add_incident_update(incident_id: str, update: AddIncidentUpdate):
     """Add a new update to an existing incident"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    
-    for i, incident in enumerate(incidents):
-        if incident.get("id") == incident_id:
-            # Add timestamp if not provided
-            new_update = update.model_dump()
-            new_update["timestamp"] = datetime.now().isoformat()
-            
-            # Add update to incident
-            if "updates" not in incidents[i]:
-                incidents[i]["updates"] = []
-            incidents[i]["updates"].append(new_update)
-            
-            # Update incident status to match the update
-            incidents[i]["status"] = update.status
-            
-            # If status is resolved and no resolved_at, set it
-            if update.status == "resolved" and not incidents[i].get("resolved_at"):
-                incidents[i]["resolved_at"] = datetime.now().isoformat()
-            
-            write_json_file(INCIDENTS_FILE, incidents)
-            
-            logger.info(f"Added update to incident: {incident_id} - {update.status}")
-            return incidents[i]
+    # Add timestamp if not provided
+    new_update = update.model_dump()
+    new_update["timestamp"] = datetime.now().isoformat()
+
+    def apply(incident):
+        # Add update to incident
+        incident["updates"] = incident.get("updates", []) + [new_update]
+        
+        # Update incident status to match the update
+        incident["status"] = update.status
+        
+        # If status is resolved and no resolved_at, set it
+        if update.status == "resolved" and not incident.get("resolved_at"):
+            incident["resolved_at"] = datetime.now().isoformat()
+        return incident
+
+    # Read-modify-write runs atomically so concurrent updates are never lost
+    incident = await asyncio.to_thread(storage.modify_incident, incident_id, apply)
+    if incident is not None:
+        recent_incidents.upsert(incident)
+        read_cache.invalidate()
+        status_stream.notify()
+        logger.info(f"Added update to incident: {incident_id} - {update.status}")
+        return incident
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -355,17 +728,104 @@ async def add_incident_update(incident_id: str, update: AddIncidentUpdate):
 @app.delete("/api/incidents/{incident_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Incidents"])
 async def delete_incident(incident_id: str):
     """Delete an incident"""
-    incidents = read_json_file(INCIDENTS_FILE)
-    
-    for i, incident in enumerate(incidents):
-        if incident.get("id") == incident_id:
-            deleted = incidents.pop(i)
-            write_json_file(INCIDENTS_FILE, incidents)
-            
-            logger.info(f"Deleted incident: {incident_id}")
-            return
+    if await asyncio.to_thread(storage.delete_incident, incident_id):
+        recent_incidents.remove(incident_id)
+        read_cache.invalidate()
+        status_stream.notify()
+        logger.info(f"Deleted incident: {incident_id}")
+        return
     
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail=f"Incident {incident_id} not found"
     )
+
+
+# ============================================================================
+# DATADOG INCIDENT SYNC
+# ============================================================================
+
+@app.post("/api/webhooks/datadog", status_code=status.HTTP_202_ACCEPTED, tags=["Incidents"])
+async def datadog_webhook(
+    payload: DatadogWebhook,
+    idempotency_key: Optional[str] = Header(None),
+    x_webhook_token: Optional[str] = Header(None)
+):
+    """
+    Receive a Datadog monitor webhook. Triggered/Warn transitions open (or
+    escalate) an incident for the monitor, Recovered resolves it. Writes are
+    batched, so the incident appears within INCIDENT_SYNC_FLUSH_INTERVAL seconds.
+    """
+    if incident_sync is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Incident sync is disabled"
+        )
+    if config.INCIDENT_WEBHOOK_TOKEN and not hmac.compare_digest(x_webhook_token or "", config.INCIDENT_WEBHOOK_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook token"
+        )
+
+    state = event_state(payload.alert_transition, payload.alert_type)
+    if state is None:
+        return {"status": "ignored"}
+
+    at = int(payload.date) / 1000 if payload.date and payload.date.isdigit() else time.time()
+    key = idempotency_key or (
+        f"event:{payload.id}" if payload.id
+        else f"webhook:{payload.alert_id}:{payload.alert_transition or payload.alert_type}:{payload.date}"
+    )
+    result = await asyncio.to_thread(incident_sync.submit, MonitorEvent(
+        key=key,
+        monitor_id=payload.alert_id,
+        state=state,
+        at=at,
+        message=payload.title or ""
+    ))
+    return {"status": result}
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics of every worker (not proxied by the frontend nginx)"""
+    snapshot = poller.snapshot
+    if snapshot is not None:
+        metrics.SNAPSHOT_AGE.set(snapshot.age_seconds)
+        for source in (SOURCE_LIVE, SOURCE_CACHED, SOURCE_ERROR):
+            metrics.SNAPSHOT_MONITORS.labels(source).set(
+                sum(1 for m in snapshot.monitors if m.get("source") == source)
+            )
+    metrics.STORAGE_SIZE.labels(storage.BACKEND).set(await asyncio.to_thread(storage.size_bytes))
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+def require_trace_store(x_profile: Optional[str] = Header(None)) -> TraceStore:
+    """Traces are only readable with the profiling token"""
+    if trace_store is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    if not config.PROFILING_TOKEN or not hmac.compare_digest(x_profile or "", config.PROFILING_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid profiling token")
+    return trace_store
+
+@app.get("/api/admin/traces", include_in_schema=False)
+async def list_traces(store: TraceStore = Depends(require_trace_store)):
+    """Stored slow/requested traces of every worker, newest first (without spans)"""
+    return {"traces": await asyncio.to_thread(store.list)}
+
+@app.get("/api/admin/traces/{trace_id}", include_in_schema=False)
+async def get_trace(trace_id: str, store: TraceStore = Depends(require_trace_store)):
+    """A stored trace with its spans and profiler output"""
+    trace = await asyncio.to_thread(store.get, trace_id)
+    if trace is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    return trace
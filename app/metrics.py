@@ -0,0 +1,114 @@
+"""
+Prometheus metrics, served at /metrics
+
+Under gunicorn every worker is its own process. When PROMETHEUS_MULTIPROC_DIR
+is set (gunicorn.conf.py sets it), each worker writes its samples to files in
+that directory and /metrics aggregates the samples of all workers.
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "status_page_http_requests_in_flight", "HTTP requests being served",
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "status_page_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+DATADOG_REQUESTS = Counter(
+    "status_page_datadog_requests_total",
+    "Datadog API calls by endpoint and outcome (status code, timeout, transport_error, cancelled or circuit_open)",
+    ["endpoint", "status"],
+)
+DATADOG_REQUEST_DURATION = Histogram(
+    "status_page_datadog_request_duration_seconds", "Datadog API call latency (each attempt)",
+    ["endpoint"], buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "status_page_cache_lookups_total", "Cache lookups by cache and result (hit, stale, miss, coalesced)",
+    ["cache", "result"],
+)
+JSON_FILE_DURATION = Histogram(
+    "status_page_json_file_duration_seconds", "JSON file read/write time",
+    ["operation", "file"], buckets=LATENCY_BUCKETS,
+)
+JSON_FILE_SIZE = Histogram(
+    "status_page_json_file_size_bytes", "Size of JSON files read/written",
+    ["operation", "file"], buckets=SIZE_BUCKETS,
+)
+STORAGE_OPERATION_DURATION = Histogram(
+    "status_page_storage_operation_duration_seconds", "Storage backend operation time",
+    ["backend", "operation"], buckets=LATENCY_BUCKETS,
+)
+STORAGE_SIZE = Gauge(
+    "status_page_storage_size_bytes", "Size of the stored monitors and incidents (database or JSON files)",
+    ["backend"], multiprocess_mode="mostrecent",
+)
+SNAPSHOT_AGE = Gauge(
+    "status_page_snapshot_age_seconds", "Seconds since the served status snapshot was fetched from Datadog",
+    multiprocess_mode="mostrecent",
+)
+SNAPSHOT_MONITORS = Gauge(
+    "status_page_snapshot_monitors", "Monitors in the served snapshot by source (live, cached, error)",
+    ["source"], multiprocess_mode="mostrecent",
+)
+
+
+def render() -> Tuple[bytes, str]:
+    """Metrics of every worker in the text exposition format, with its content type"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording in-flight requests and latency per route
+    template (e.g. /api/incidents/{incident_id}), so ids don't create series.
+    Paths starting with a prefix in `exclude` (long-lived streams) are not recorded.
+    """
+
+    def __init__(self, app, exclude: Tuple[str, ...] = ()):
+        self.app = app
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code: Optional[int] = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code or 500),
+            ).observe(time.perf_counter() - started)
@@ -25,6 +25,44 @@ class MonitorResponse(BaseModel):
     descricao_monitor: str
 
 
+class UptimeSeconds(BaseModel):
+    """Seconds spent in each state during a bucket"""
+    ok: float
+    warn: float
+    alert: float
+    no_data: float
+
+
+class UptimeBucket(BaseModel):
+    """Uptime of a monitor during one day or hour"""
+    start: str = Field(..., description="ISO 8601 start of the bucket (UTC)")
+    uptime_percent: Optional[float] = Field(None, description="OK + Warn time over time with data (null without data)")
+    worst_state: Literal["OK", "Warn", "Alert", "No Data"]
+    seconds: UptimeSeconds
+
+
+class UptimeResponse(BaseModel):
+    """Model for monitor uptime history response"""
+    monitor: MonitorResponse
+    resolution: Literal["day", "hour"]
+    uptime_percent: Optional[float] = Field(None, description="Uptime over the whole window")
+    buckets: List[UptimeBucket]
+
+
+class MonitorUptime(BaseModel):
+    """Uptime history of one monitor in the all-monitors response"""
+    id: int = Field(..., description="Datadog monitor ID")
+    uptime_percent: Optional[float] = Field(None, description="Uptime over the whole window")
+    buckets: List[UptimeBucket]
+
+
+class UptimeSummaryResponse(BaseModel):
+    """Model for the uptime history of every monitor on the status page"""
+    resolution: Literal["day", "hour"]
+    days: int
+    monitors: List[MonitorUptime]
+
+
 # Incident Models
 class IncidentUpdate(BaseModel):
     """Model for incident status updates"""
@@ -67,6 +105,21 @@ class IncidentResponse(BaseModel):
     updates: List[IncidentUpdate]
 
 
+class DatadogWebhook(BaseModel):
+    """
+    Payload of a Datadog monitor webhook. Configure the webhook body in
+    Datadog with these template variables:
+    {"id": "$ID", "alert_id": "$ALERT_ID", "alert_transition": "$ALERT_TRANSITION",
+     "alert_type": "$ALERT_TYPE", "date": "$DATE", "title": "$EVENT_TITLE"}
+    """
+    id: Optional[str] = Field(None, description="Datadog event ID ($ID), used as idempotency key")
+    alert_id: str = Field(..., description="Datadog monitor ID ($ALERT_ID)")
+    alert_transition: Optional[str] = Field(None, description="Triggered, Recovered, Warn, ... ($ALERT_TRANSITION)")
+    alert_type: Optional[str] = Field(None, description="error, warning or success ($ALERT_TYPE)")
+    date: Optional[str] = Field(None, description="Event time in epoch milliseconds ($DATE)")
+    title: Optional[str] = Field(None, description="Event title ($EVENT_TITLE)")
+
+
 class AddIncidentUpdate(BaseModel):
     """Model for adding a single update to an existing incident"""
     status: Literal["investigating", "identified", "monitoring", "resolved"]
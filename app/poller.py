@@ -0,0 +1,474 @@
+"""
+Background poller that keeps an in-memory snapshot of monitor states
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.datadog_client import (
+    SOURCE_CACHED, SOURCE_ERROR, SOURCE_LIVE, MonitorStatus, get_monitor_statuses, restore_statuses,
+)
+from app.responses import encode_json, make_etag
+from app.shared_state import SharedState, worker_id
+
+logger = logging.getLogger(__name__)
+
+# Keys in the shared state store
+SNAPSHOT_KEY = "status_snapshot"
+MONITORS_KEY = "monitors"
+
+
+def compute_overall_status(states: Iterable[str], failed: int = 0) -> str:
+    """
+    Derive the overall system status from individual monitor states.
+    `failed` counts monitors whose state couldn't be fetched at all; they keep
+    the page from reporting "operational".
+    """
+    # Filter out "No Data" and "Skipped" for status calculation
+    # These are informational, not failures
+    active_statuses = [
+        status for status in states
+        if status not in ["No Data", "Skipped"]
+    ]
+
+    # Determine overall status based on active monitors
+    if not active_statuses:
+        # All monitors are "No Data" or "Skipped"
+        return "unknown"
+    elif any(status == "Alert" for status in active_statuses):
+        # At least one monitor is in alert state
+        return "major_outage"
+    elif any(status == "Warn" for status in active_statuses):
+        # At least one monitor is in warning state
+        return "partial_outage"
+    elif failed:
+        # Nothing is known to be failing, but some monitors couldn't be checked
+        return "unknown"
+    elif all(status == "OK" for status in active_statuses):
+        # All active monitors are OK
+        return "operational"
+    else:
+        # Unexpected status
+        return "unknown"
+
+
+@dataclass(frozen=True)
+class StatusSnapshot:
+    """
+    Immutable view of every monitor's state at the time it was fetched.
+    `etag` identifies the monitor states (not the fetch time), and `changed_at`
+    is when they last changed. Responses also show the fetch time, so they use
+    `validator` and `last_modified`, which change with it too.
+    `fetched_at` is when the oldest known state in it was fetched from Datadog
+    (so age_seconds is the age of the data), `refreshed_at` when it was built.
+    """
+    monitors: Tuple[Dict[str, Any], ...]
+    page_monitors: Tuple[Dict[str, Any], ...]
+    overall: str
+    fetched_at: float
+    etag: str
+    changed_at: float
+    refreshed_at: float = 0.0
+
+    @property
+    def updated_at(self) -> str:
+        return datetime.fromtimestamp(self.fetched_at).isoformat()
+
+    @property
+    def age_seconds(self) -> float:
+        return round(max(0.0, time.time() - self.fetched_at), 3)
+
+    @property
+    def validator(self) -> str:
+        """
+        Weak ETag of the responses built from this snapshot: states plus fetch
+        time (weak because the age they report changes on every request)
+        """
+        return "W/" + make_etag(f"{self.etag}{self.fetched_at!r}".encode("ascii"))
+
+    @property
+    def last_modified(self) -> float:
+        return max(self.changed_at, self.fetched_at)
+
+    @property
+    def stale_monitors(self) -> int:
+        """Monitors served from their last known state because Datadog failed"""
+        return sum(1 for m in self.monitors if m.get("source") == SOURCE_CACHED)
+
+    @property
+    def failed_monitors(self) -> int:
+        """Monitors with no known state because Datadog failed"""
+        return sum(1 for m in self.monitors if m.get("source") == SOURCE_ERROR)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "monitors": list(self.monitors),
+            "page_monitors": list(self.page_monitors),
+            "overall": self.overall,
+            "fetched_at": self.fetched_at,
+            "etag": self.etag,
+            "changed_at": self.changed_at,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StatusSnapshot":
+        return cls(
+            monitors=tuple(data["monitors"]),
+            page_monitors=tuple(data["page_monitors"]),
+            overall=data["overall"],
+            fetched_at=data["fetched_at"],
+            etag=data.get("etag") or make_etag(encode_json([data["monitors"], data["overall"]])),
+            changed_at=data.get("changed_at", data["fetched_at"]),
+            refreshed_at=data.get("refreshed_at", data["fetched_at"]),
+        )
+
+
+def build_snapshot(
+    monitors: List[Dict[str, Any]],
+    states: Dict[int, MonitorStatus],
+    previous: Optional[StatusSnapshot] = None,
+) -> StatusSnapshot:
+    """
+    Build a snapshot from the monitor configuration and the fetched states.
+    Monitors not served live carry `error` and, if cached, `last_fetched_at`
+    (when their state was last fetched), so clients can show how stale they
+    are. Live monitors carry `error` only when Datadog reported one.
+    """
+    api_monitors = []
+    page_monitors = []
+    for monitor in monitors:
+        monitor_id = int(monitor["url_monitor"])
+        result = states.get(monitor_id) or MonitorStatus("No Data", time.time(), SOURCE_ERROR, "missing")
+        estado = result.state
+        api_monitor = {
+            "id": monitor_id,
+            "name": monitor["nome_monitor"],
+            "description": monitor["descricao_monitor"],
+            "status": estado,
+            "source": result.source
+        }
+        if result.source != SOURCE_LIVE or result.error is not None:
+            # Live states can carry one too (not_found: Datadog answered 404)
+            api_monitor["error"] = result.error
+        if result.source == SOURCE_CACHED:
+            api_monitor["last_fetched_at"] = datetime.fromtimestamp(result.fetched_at).isoformat()
+        api_monitors.append(api_monitor)
+        page_monitors.append({
+            "nome_monitor": monitor["nome_monitor"],
+            "descricao_monitor": monitor["descricao_monitor"],
+            "estado": estado
+        })
+
+    overall = compute_overall_status(
+        (m["status"] for m in api_monitors if m["source"] != SOURCE_ERROR),
+        failed=sum(1 for m in api_monitors if m["source"] == SOURCE_ERROR),
+    )
+    etag = make_etag(encode_json([api_monitors, overall]))
+    refreshed_at = time.time()
+    fetched_at = min(
+        (result.fetched_at for result in states.values() if result.source != SOURCE_ERROR),
+        default=refreshed_at,
+    )
+    changed_at = previous.changed_at if previous is not None and previous.etag == etag else refreshed_at
+
+    return StatusSnapshot(
+        monitors=tuple(api_monitors),
+        page_monitors=tuple(page_monitors),
+        overall=overall,
+        fetched_at=fetched_at,
+        etag=etag,
+        changed_at=changed_at,
+        refreshed_at=refreshed_at,
+    )
+
+
+def save_snapshot(path: str, snapshot: StatusSnapshot):
+    """Write a snapshot to `path` atomically (temp file + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_snapshot(path: str) -> Optional[StatusSnapshot]:
+    """Read a snapshot saved by save_snapshot, or None if missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = StatusSnapshot.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable status snapshot {path}: {e}")
+        return None
+    return snapshot
+
+
+def snapshot_statuses(snapshot: StatusSnapshot) -> Dict[int, MonitorStatus]:
+    """States of the monitors in a snapshot that were fetched successfully, as of their fetch time"""
+    statuses = {}
+    for m in snapshot.monitors:
+        if m.get("source") == SOURCE_LIVE:
+            statuses[m["id"]] = MonitorStatus(m["status"], snapshot.fetched_at)
+        elif m.get("source") == SOURCE_CACHED and m.get("last_fetched_at"):
+            statuses[m["id"]] = MonitorStatus(m["status"], datetime.fromisoformat(m["last_fetched_at"]).timestamp())
+    return statuses
+
+
+def restored_snapshot(snapshot: StatusSnapshot) -> StatusSnapshot:
+    """
+    A snapshot saved by a previous run as served before the first refresh:
+    live monitors become cached (error="restored") so clients see their age.
+    """
+    monitors = tuple(
+        {**m, "source": SOURCE_CACHED, "error": "restored", "last_fetched_at": snapshot.updated_at}
+        if m.get("source") == SOURCE_LIVE else m
+        for m in snapshot.monitors
+    )
+    return replace(snapshot, monitors=monitors, etag=make_etag(encode_json([list(monitors), snapshot.overall])))
+
+
+class StatusPoller:
+    """
+    Refreshes monitor states on a fixed interval and publishes them as an
+    immutable StatusSnapshot, so read endpoints never call Datadog directly.
+
+    With a SharedState store, only the worker holding the poller lease talks to
+    Datadog; the other workers pick up its snapshot (and any monitor config
+    change) by checking generation counters every `sync_interval` seconds.
+
+    With a `persist_path`, the polling worker saves the snapshot there at most
+    every `persist_interval` seconds and on shutdown, and warm_start() serves
+    it on the next start until the first refresh completes.
+    """
+
+    LEASE = "status_poller"
+
+    def __init__(
+        self,
+        get_monitors: Callable[[], List[Dict[str, Any]]],
+        interval: float,
+        shared: Optional[SharedState] = None,
+        set_monitors: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        sync_interval: float = 1.0,
+        on_refresh: Optional[Callable[[Dict[int, MonitorStatus]], None]] = None,
+        persist_path: str = "",
+        persist_interval: float = 60.0,
+    ):
+        self._get_monitors = get_monitors
+        self._set_monitors = set_monitors
+        self._on_refresh = on_refresh
+        self.interval = interval
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        self.snapshot: Optional[StatusSnapshot] = None
+        # Whether this worker did the polling on its last tick (holds the lease)
+        self.leader = False
+        self._snapshot_generation = 0
+        self._monitors_generation = 0
+        # refreshed_at of the last snapshot saved to persist_path
+        self._persisted_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    async def _refresh_locked(self) -> StatusSnapshot:
+        monitors = list(self._get_monitors())
+        # Expired states are refetched now: serving them while they revalidate
+        # would leave every snapshot one poll behind
+        states = await get_monitor_statuses((int(m["url_monitor"]) for m in monitors), allow_stale=False)
+        self.snapshot = build_snapshot(monitors, states, previous=self.snapshot)
+        # SQLite writes (shared snapshot, refresh hook) run in a thread: they may
+        # wait for other workers' write locks
+        if self.shared is not None:
+            self._snapshot_generation = await asyncio.to_thread(self.shared.write, SNAPSHOT_KEY, self.snapshot.to_dict())
+        if self._on_refresh is not None:
+            try:
+                await asyncio.to_thread(self._on_refresh, states)
+            except Exception as e:
+                logger.error(f"Error in status refresh hook: {e}")
+        logger.info(f"Status snapshot refreshed: {len(monitors)} monitors, overall={self.snapshot.overall}")
+        if self.persist_path and self.snapshot.refreshed_at - self._persisted_at >= self.persist_interval:
+            await self._persist()
+        return self.snapshot
+
+    async def _persist(self):
+        snapshot = self.snapshot
+        try:
+            await asyncio.to_thread(save_snapshot, self.persist_path, snapshot)
+            self._persisted_at = snapshot.refreshed_at
+        except OSError as e:
+            logger.error(f"Error saving status snapshot to {self.persist_path}: {e}")
+
+    def warm_start(self, max_age: float) -> bool:
+        """
+        Serve the snapshot shared by another worker, or else the one saved by
+        a previous run, until the first refresh. Either is used only if it is
+        at most `max_age` seconds old and for the same monitor configuration,
+        and its monitors are served as cached (error="restored"). Its states
+        also seed the status cache, so the first refresh only asks Datadog for
+        what expired. Called before start().
+        """
+        if self.snapshot is not None:
+            return False
+        if self.shared is not None:
+            # Even if it's rejected, only adopt later shared snapshots (from a live poller)
+            self._snapshot_generation, data = self.shared.read(SNAPSHOT_KEY)
+            if data is not None and self._warm_start_from(StatusSnapshot.from_dict(data), "shared state", max_age):
+                return True
+        if not self.persist_path:
+            return False
+        snapshot = load_snapshot(self.persist_path)
+        if snapshot is None or not self._warm_start_from(snapshot, self.persist_path, max_age):
+            return False
+        self._persisted_at = snapshot.refreshed_at
+        if self.shared is not None:
+            self._snapshot_generation = self.shared.write(SNAPSHOT_KEY, self.snapshot.to_dict())
+        return True
+
+    def _warm_start_from(self, snapshot: StatusSnapshot, origin: str, max_age: float) -> bool:
+        """Serve `snapshot` as restored if it is recent enough and matches the monitor configuration"""
+        if snapshot.age_seconds > max_age:
+            logger.info(f"Ignoring status snapshot from {origin}: {snapshot.age_seconds:.0f}s old (max {max_age:.0f}s)")
+            return False
+        configured = [(int(m["url_monitor"]), m["nome_monitor"], m["descricao_monitor"]) for m in self._get_monitors()]
+        if configured != [(m["id"], m["name"], m["description"]) for m in snapshot.monitors]:
+            logger.info(f"Ignoring status snapshot from {origin}: the monitor configuration changed")
+            return False
+
+        restore_statuses(snapshot_statuses(snapshot))
+        self.snapshot = restored_snapshot(snapshot)
+        logger.info(f"Warm start from {origin}: {len(snapshot.monitors)} monitors, {snapshot.age_seconds:.0f}s old")
+        return True
+
+    async def refresh(self) -> StatusSnapshot:
+        """Fetch every monitor once and replace the current snapshot"""
+        async with self._lock:
+            return await self._refresh_locked()
+
+    async def get_snapshot(self) -> StatusSnapshot:
+        """Return the current snapshot, waiting for the first refresh if needed"""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            if self.snapshot is None and self.shared is not None:
+                await asyncio.to_thread(self._load_shared_snapshot)
+            if self.snapshot is None:
+                return await self._refresh_locked()
+            return self.snapshot
+
+    def trigger(self):
+        """Ask the background loop to refresh now (e.g. after a monitor change)"""
+        self._wake.set()
+
+    async def publish_monitors(self, monitors: List[Dict[str, Any]]):
+        """Share a new monitor configuration with the other workers"""
+        if self.shared is not None:
+            self._monitors_generation = await asyncio.to_thread(self.shared.write, MONITORS_KEY, monitors)
+        self.trigger()
+
+    def _load_shared_snapshot(self) -> bool:
+        """Adopt the shared snapshot if another worker published a newer one"""
+        generation = self.shared.generation(SNAPSHOT_KEY)
+        if generation == self._snapshot_generation:
+            return False
+        generation, data = self.shared.read(SNAPSHOT_KEY)
+        if data is None:
+            return False
+        self.snapshot = StatusSnapshot.from_dict(data)
+        self._snapshot_generation = generation
+        return True
+
+    def _sync_monitors(self) -> bool:
+        """Adopt the shared monitor configuration if it changed"""
+        generation = self.shared.generation(MONITORS_KEY)
+        if generation == self._monitors_generation:
+            return False
+        generation, monitors = self.shared.read(MONITORS_KEY)
+        self._monitors_generation = generation
+        if monitors is None or self._set_monitors is None:
+            return False
+        self._set_monitors(monitors)
+        logger.info(f"Monitor configuration updated by another worker ({len(monitors)} monitors)")
+        return True
+
+    def seed_monitors(self, monitors: List[Dict[str, Any]]):
+        """Publish the monitor list loaded from storage on startup if the shared copy differs"""
+        if self.shared is None:
+            return
+        generation, shared_monitors = self.shared.read(MONITORS_KEY)
+        if shared_monitors != monitors:
+            generation = self.shared.write(MONITORS_KEY, monitors)
+        self._monitors_generation = generation
+
+    def _sync_shared(self) -> bool:
+        """Adopt shared changes and renew (or take) the poller lease; True if the monitors changed"""
+        changed = self._sync_monitors()
+        lease_ttl = max(self.interval * 3, self.sync_interval * 5)
+        self.leader = self.shared.try_acquire_lease(self.LEASE, worker_id(), lease_ttl)
+        self._load_shared_snapshot()
+        return changed
+
+    async def _tick(self, triggered: bool):
+        if self.shared is None:
+            self.leader = True
+        else:
+            triggered = await asyncio.to_thread(self._sync_shared) or triggered
+            if not self.leader:
+                return
+
+        snapshot = self.snapshot
+        if triggered or snapshot is None or time.time() - snapshot.refreshed_at >= self.interval:
+            await self.refresh()
+
+    async def _run(self):
+        tick = self.interval if self.shared is None else min(self.interval, self.sync_interval)
+        triggered = True
+        while True:
+            self._wake.clear()
+            try:
+                await self._tick(triggered)
+            except Exception as e:
+                logger.error(f"Error refreshing status snapshot: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=tick)
+                triggered = True
+            except asyncio.TimeoutError:
+                triggered = False
+
+    def start(self):
+        """Start the background refresh loop (called from the app startup hook)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Status poller started (interval: {self.interval}s)")
+
+    async def stop(self):
+        """Stop the background refresh loop (called from the app shutdown hook)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            snapshot = self.snapshot
+            if self.persist_path and self.leader and snapshot is not None and snapshot.refreshed_at > self._persisted_at:
+                await self._persist()
+            if self.shared is not None:
+                await asyncio.to_thread(self.shared.release_lease, self.LEASE, worker_id())
+            self.leader = False
+            logger.info("Status poller stopped")
@@ -0,0 +1,273 @@
+"""
+Opt-in per-request profiling: span breakdowns and slow-request traces
+
+A request is traced when it carries `X-Profile: <PROFILING_TOKEN>` or is picked
+by PROFILING_SAMPLE_RATE. While traced, span() records how long each step took
+(Datadog calls, JSON file reads/writes, incident loading, serialization).
+Traced requests slower than PROFILING_SLOW_MS, and every header-triggered one,
+are kept in a ring buffer stored in a SQLite file, so all gunicorn workers
+share it; /api/admin/traces reads it back.
+"""
+import asyncio
+import contextvars
+import hmac
+import importlib.util
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Spans recorded while serving one request"""
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.finished = False
+
+    def add_span(self, name: str, start: float, end: float, attrs: Dict[str, Any]):
+        if not self.finished:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self._start) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3),
+                **attrs,
+            })
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Total time and count per span name"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            entry = totals.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span["duration_ms"], 3)
+        return totals
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("profiling_trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block as part of the current request's trace (no-op when the
+    request isn't traced). Yields a dict where attributes known only at the
+    end (e.g. a status code or size) can be added; an exception leaving the
+    block is recorded as `error`.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        trace.add_span(name, start, time.perf_counter(), attrs)
+
+
+class TraceStore:
+    """
+    Ring buffer of the last `size` traces in a SQLite file. The connection is
+    opened on first use, so each forked worker gets its own.
+    """
+
+    def __init__(self, path: str, size: int = 50):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS traces ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " id TEXT NOT NULL UNIQUE,"
+                " summary TEXT NOT NULL,"
+                " data TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, record: Dict[str, Any]):
+        summary = {k: v for k, v in record.items() if k not in ("spans", "profile")}
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO traces (id, summary, data) VALUES (?, ?, ?)",
+                    (record["id"], json.dumps(summary), json.dumps(record)),
+                )
+                conn.execute("DELETE FROM traces WHERE seq <= (SELECT MAX(seq) FROM traces) - ?", (self.size,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Trace summaries, newest first"""
+        with self._lock:
+            rows = self._connection().execute("SELECT summary FROM traces ORDER BY seq DESC").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute("SELECT data FROM traces WHERE id = ?", (trace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class _Profiler:
+    """cProfile or pyinstrument around one request; only one runs at a time per process"""
+
+    _busy = threading.Lock()
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._profiler: Any = None
+
+    def start(self) -> bool:
+        if self.kind == "none" or not self._busy.acquire(blocking=False):
+            return False
+        if self.kind == "pyinstrument":
+            from pyinstrument import Profiler
+            self._profiler = Profiler(async_mode="enabled")
+            self._profiler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return True
+
+    def stop(self) -> str:
+        try:
+            if self.kind == "pyinstrument":
+                self._profiler.stop()
+                return self._profiler.output_text(unicode=True, color=False)
+            import pstats
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            return out.getvalue()
+        finally:
+            self._busy.release()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that traces opted-in requests and stores the slow ones.
+
+    The profiler (if any) only runs for header-triggered requests: cProfile
+    sees every coroutine the event loop runs meanwhile, so it is not suited to
+    always-on sampling.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: TraceStore,
+        token: str = "",
+        sample_rate: float = 0.0,
+        slow_ms: float = 500.0,
+        profiler: str = "none",
+        exclude: Tuple[str, ...] = (),
+    ):
+        self.app = app
+        self.exclude = exclude
+        self.store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        if profiler == "pyinstrument" and importlib.util.find_spec("pyinstrument") is None:
+            logger.warning("PROFILING_PROFILER=pyinstrument but the package is not installed, using cProfile")
+            profiler = "cprofile"
+        self.profiler = profiler
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name == b"x-profile":
+                    return "header" if hmac.compare_digest(value.decode("latin-1"), self.token) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        traced = scope["type"] == "http" and not scope["path"].startswith(self.exclude)
+        trigger = self._trigger(scope) if traced else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"], trigger)
+        profiler = _Profiler(self.profiler if trigger == "header" else "none")
+        profiling = profiler.start()
+        status_code: Optional[int] = None
+
+        async def send_with_trace_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.id.encode("ascii"))]
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current.reset(token)
+            trace.finished = True
+            duration_ms = (time.perf_counter() - trace._start) * 1000
+            profile = profiler.stop() if profiling else None
+            if trigger == "header" or duration_ms >= self.slow_ms:
+                route = scope.get("route")
+                record = {
+                    "id": trace.id,
+                    "method": trace.method,
+                    "path": trace.path,
+                    "route": getattr(route, "path", None),
+                    "status": status_code,
+                    "trigger": trigger,
+                    "started_at": datetime.fromtimestamp(trace.started_at).isoformat(),
+                    "duration_ms": round(duration_ms, 3),
+                    "pid": os.getpid(),
+                    "breakdown": trace.summary(),
+                    "spans": trace.spans,
+                    "profile": profile,
+                }
+                try:
+                    await asyncio.to_thread(self.store.add, record)
+                except Exception as e:
+                    logger.error(f"Could not store trace {trace.id}: {e}")
+                if trigger == "sample":
+                    logger.warning(f"Slow request {trace.method} {trace.path} took {duration_ms:.0f}ms (trace {trace.id})")
+
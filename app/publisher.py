@@ -0,0 +1,147 @@
+"""
+Static snapshot publisher: writes the status page and API documents to disk
+so they can be served by nginx or object storage without the backend
+"""
+import asyncio
+import gzip
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.poller import StatusPoller, StatusSnapshot
+from app.incidents_view import RecentIncidentsView
+from app.responses import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+def summary_document(snapshot: StatusSnapshot, incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The /api/summary payload"""
+    return {
+        "monitors": snapshot.monitors,
+        "status": {"status": snapshot.overall, "updated_at": snapshot.updated_at},
+        "incidents": incidents,
+        "updated_at": snapshot.updated_at
+    }
+
+
+def write_file_atomic(path: str, data: bytes):
+    """Write a file via a temp file + rename, so readers see the old or the new version, never a partial one"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class StaticPublisher:
+    """
+    Renders index.html and api/{monitors,status,incidents,summary}.json into
+    `directory` whenever the monitor states or recent incidents change, and at
+    least every `max_age` seconds so the timestamps stay fresh. Each file (and
+    its .gz variant for nginx `gzip_static`) is replaced atomically.
+
+    With shared state, only the worker that holds the poller lease publishes.
+    """
+
+    def __init__(
+        self,
+        poller: StatusPoller,
+        incidents: RecentIncidentsView,
+        render_page: Callable[[StatusSnapshot], str],
+        directory: str,
+        max_age: float = 30.0,
+        check_interval: float = 1.0,
+    ):
+        self.poller = poller
+        self.incidents = incidents
+        self.render_page = render_page
+        self.directory = directory
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._published_key = None
+        self._published_fetched_at = None
+        self._published_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _documents(self, snapshot: StatusSnapshot) -> Dict[str, bytes]:
+        incidents = self.incidents.incidents()
+        # No snapshot_age_seconds: it would be frozen at publish time, while
+        # the files are served (and cached) long after that
+        return {
+            "api/monitors.json": encode_json({
+                "monitors": snapshot.monitors,
+                "updated_at": snapshot.updated_at
+            }),
+            "api/status.json": encode_json({
+                "status": snapshot.overall,
+                "updated_at": snapshot.updated_at,
+                "stale_monitors": snapshot.stale_monitors,
+                "failed_monitors": snapshot.failed_monitors
+            }),
+            "api/incidents.json": encode_json({"incidents": incidents}),
+            "api/summary.json": encode_json(summary_document(snapshot, incidents)),
+            # Written last: the page only appears once its data files exist
+            "index.html": self.render_page(snapshot).encode("utf-8"),
+        }
+
+    def _write(self, documents: Dict[str, bytes]):
+        for name, data in documents.items():
+            path = os.path.join(self.directory, name)
+            write_file_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            write_file_atomic(path, data)
+
+    async def publish(self, snapshot: StatusSnapshot):
+        """Write every document for `snapshot` (file I/O runs in a thread)"""
+        key = (snapshot.etag, self.incidents.body().etag)
+        await asyncio.to_thread(self._write, self._documents(snapshot))
+        self._published_key = key
+        self._published_fetched_at = snapshot.fetched_at
+        self._published_at = time.time()
+        logger.info(f"Published static snapshot to {self.directory} (overall={snapshot.overall})")
+
+    async def _check(self):
+        snapshot = self.poller.snapshot
+        if snapshot is None or (self.poller.shared is not None and not self.poller.leader):
+            return
+        changed = (snapshot.etag, self.incidents.body().etag) != self._published_key
+        expired = (
+            time.time() - self._published_at >= self.max_age
+            and snapshot.fetched_at != self._published_fetched_at
+        )
+        if changed or expired:
+            await self.publish(snapshot)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._check()
+            except Exception as e:
+                logger.error(f"Error publishing static snapshot: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        """Start the publish loop (called from the app startup hook)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Static publisher started (directory: {self.directory})")
+
+    async def stop(self):
+        """Stop the publish loop (called from the app shutdown hook)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,160 @@
+"""
+Helpers for building pre-encoded API responses with HTTP caching headers
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from app import config
+from app.metrics import CACHE_LOOKUPS
+from app.profiling import span
+
+
+def encode_json(content: Any) -> bytes:
+    """Encode a response body the same way FastAPI's JSONResponse does"""
+    with span("serialize") as attrs:
+        data = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+        attrs["bytes"] = len(data)
+    return data
+
+
+def make_etag(data: bytes) -> str:
+    """Strong ETag derived from a content hash"""
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def gzip_etag(etag: str) -> str:
+    """ETag of the gzip-encoded variant of a response: a different body needs its own strong tag"""
+    return f'{etag[:-1]}-gzip"'
+
+
+class EncodedBody:
+    """A response body encoded once, with its ETag and a lazily built gzip variant"""
+
+    __slots__ = ("body", "etag", "last_modified", "_gzipped")
+
+    def __init__(self, body: bytes, last_modified: Optional[float] = None, etag: Optional[str] = None):
+        # `etag` must change whenever `body` does (it defaults to a hash of it)
+        self.body = body
+        self.etag = etag or make_etag(body)
+        self.last_modified = last_modified
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+
+class VersionedCache:
+    """
+    Values (typically EncodedBody) built once per key and reused until the
+    data changes: the whole cache is dropped when `version()` returns a new
+    token (a write by another process) or invalidate() is called (a write by
+    this one). Holds at most `max_entries` keys, least recently used first out.
+    """
+
+    def __init__(self, version: Callable[[], Any], max_entries: int = 256, name: str = "responses"):
+        self.name = name
+        self._version = version
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._cached_version: Any = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """Cached value for `key`, built with build() on a miss (None results are not cached)"""
+        version = self._version()
+        with self._lock:
+            if version != self._cached_version:
+                self._entries.clear()
+                self._cached_version = version
+            if key in self._entries:
+                CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            generation = self._generation
+
+        CACHE_LOOKUPS.labels(self.name, "miss").inc()
+        value = build()
+        with self._lock:
+            # Don't keep a value built from data that was invalidated meanwhile
+            if value is not None and generation == self._generation and version == self._cached_version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+def cache_headers(etag: str, last_modified: Optional[float] = None, public: bool = True) -> Dict[str, str]:
+    """
+    Validators plus a Cache-Control policy that lets nginx/CDNs serve the
+    response (or, when not public, makes clients revalidate every time)
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={config.HTTP_CACHE_MAX_AGE}, "
+            f"stale-while-revalidate={config.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+        ) if public else "no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """Evaluate If-None-Match (or, without it, If-Modified-Since) against the current validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as required for GET/HEAD
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(etag: str, last_modified: Optional[float] = None, public: bool = True) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified, public))
+
+
+def encoded_response(
+    request: Request, encoded: EncodedBody, media_type: str = "application/json", public: bool = True
+) -> Response:
+    """
+    Serve a pre-encoded body: 304 if the client's copy is current, otherwise
+    the body (pre-gzipped when the client accepts it and it's large enough).
+    The gzip variant has its own ETag.
+    """
+    gzipped = len(encoded.body) >= config.GZIP_MINIMUM_SIZE and "gzip" in request.headers.get("accept-encoding", "")
+    etag = gzip_etag(encoded.etag) if gzipped else encoded.etag
+    if is_not_modified(request, etag, encoded.last_modified):
+        response = not_modified_response(etag, encoded.last_modified, public)
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    headers = cache_headers(etag, encoded.last_modified, public)
+    headers["Vary"] = "Accept-Encoding"
+    if not gzipped:
+        return Response(content=encoded.body, media_type=media_type, headers=headers)
+    headers["Content-Encoding"] = "gzip"
+    return Response(content=encoded.gzipped, media_type=media_type, headers=headers)
@@ -0,0 +1,117 @@
+"""
+Host-local state shared between gunicorn workers, backed by a SQLite file
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    """Identify this worker process (evaluated lazily so forked workers differ)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedState:
+    """
+    Versioned key/value store shared by every worker on the host.
+
+    Each key carries a generation counter that is bumped on every write, so
+    workers can detect changes with a cheap SELECT and only decode the value
+    when it actually changed. A lease table lets one worker at a time own a
+    background job (e.g. polling Datadog) for the whole host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=2.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " key TEXT PRIMARY KEY,"
+            " generation INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        logger.info(f"Shared state opened at {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def generation(self, key: str) -> int:
+        """Return the current generation of a key (0 if it was never written)"""
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def updated_at(self, key: str) -> float:
+        """Return the epoch time of the last write to a key (0 if it was never written)"""
+        with self._lock:
+            row = self._conn.execute("SELECT updated_at FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def read(self, key: str) -> Tuple[int, Optional[Any]]:
+        """Return (generation, value) for a key, or (0, None) if it was never written"""
+        with self._lock:
+            row = self._conn.execute("SELECT generation, value FROM state WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def write(self, key: str, value: Any) -> int:
+        """Store a value and return its new generation"""
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO state (key, generation, value, updated_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET generation = generation + 1, "
+                "value = excluded.value, updated_at = excluded.updated_at "
+                "RETURNING generation",
+                (key, encoded, time.time()),
+            ).fetchone()
+        return row[0]
+
+    def try_acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew a named lease for `ttl` seconds.
+        Returns True if `owner` holds the lease afterwards.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ? "
+                "RETURNING owner",
+                (name, owner, now + ttl, now),
+            ).fetchone()
+        return row is not None and row[0] == owner
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+def open_shared_state(path: str) -> Optional[SharedState]:
+    """Open the shared state store, or return None (single-worker mode) if it can't be opened"""
+    try:
+        return SharedState(path)
+    except sqlite3.Error as e:
+        logger.error(f"Could not open shared state at {path}, workers will not share state: {e}")
+        return None
+
@@ -0,0 +1,928 @@
+"""
+Storage backends for monitors and incidents
+
+SQLiteStorage (default) keeps each monitor/incident as its own row, indexed by
+url_monitor, incident id, created_at, status, severity and affected service, so
+lookups, updates and paginated listings don't touch the rest of the history.
+JSONFileStorage keeps the original whole-file behaviour. The JSON files remain
+the import/export format:
+
+    python -m app.storage export   # write monitors.json / incidents.json
+    python -m app.storage import   # replace stored data with the JSON files
+"""
+import abc
+import base64
+import binascii
+import functools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app import config
+from app.crud_helpers import (
+    read_json_file, write_json_file, locked_file, compute_etag, etag_matches, parse_timestamp,
+    MONITORS_FILE, INCIDENTS_FILE
+)
+from app.metrics import STORAGE_OPERATION_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class ConflictError(Exception):
+    """Raised when creating or renaming a record would duplicate an existing ID"""
+
+
+class PreconditionFailedError(Exception):
+    """Raised when an If-Match precondition doesn't match the stored record"""
+
+
+Mutator = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+# Receives the current record (None if it doesn't exist) and returns the new
+# record, or None to leave it unchanged
+Upsert = Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]
+
+
+# Position in the incident listing (created_at timestamp, id), newest first
+IncidentKey = Tuple[float, str]
+
+
+@dataclass(frozen=True)
+class IncidentFilter:
+    """Filters for incident listings (None means no filter); hashable, so usable as a cache key"""
+    status: Optional[Tuple[str, ...]] = None
+    severity: Optional[Tuple[str, ...]] = None
+    service: Optional[str] = None
+    since: Optional[float] = None
+    until: Optional[float] = None
+
+    def matches(self, incident: Dict[str, Any]) -> bool:
+        created_ts = incident_key(incident)[0]
+        return (
+            (not self.status or incident.get("status") in self.status)
+            and (not self.severity or incident.get("severity") in self.severity)
+            and (self.service is None or self.service in (incident.get("affected_services") or []))
+            and (self.since is None or created_ts >= self.since)
+            and (self.until is None or created_ts < self.until)
+        )
+
+
+def incident_key(incident: Dict[str, Any]) -> IncidentKey:
+    """Sort key of an incident in listings (unparseable created_at sorts as oldest)"""
+    return (parse_timestamp(incident.get("created_at")) or 0.0, str(incident.get("id")))
+
+
+def encode_cursor(key: IncidentKey) -> str:
+    """Opaque pagination cursor pointing after `key`"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> IncidentKey:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        created_ts, incident_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (float(created_ts), str(incident_id))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _ndjson(documents: Iterable[str]) -> bytes:
+    """One NDJSON chunk: every document followed by a newline"""
+    return "".join(f"{document}\n" for document in documents).encode("utf-8")
+
+
+def _unused_id(incident_id: str, taken: Callable[[str], bool]) -> str:
+    """`incident_id`, or it with the first free -2, -3, ... suffix if it is taken"""
+    candidate, n = incident_id, 1
+    while taken(candidate):
+        n += 1
+        candidate = f"{incident_id}-{n}"
+    return candidate
+
+
+def _updater(fields: Dict[str, Any], if_match: Optional[str]) -> Mutator:
+    """Build a mutator that checks If-Match against the current record, then applies fields"""
+    def apply(item: Dict[str, Any]) -> Dict[str, Any]:
+        if not etag_matches(if_match, compute_etag(item)):
+            raise PreconditionFailedError()
+        item.update(fields)
+        return item
+    return apply
+
+
+def timed(operation: Optional[str] = None):
+    """Record the duration of a backend method, labelled with the backend and `operation` (default: its name)"""
+    def decorate(method):
+        name = operation or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                STORAGE_OPERATION_DURATION.labels(self.BACKEND, name).observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+class Storage(abc.ABC):
+    """Interface shared by the storage backends"""
+
+    BACKEND = ""
+
+    @abc.abstractmethod
+    def version(self) -> Any:
+        """
+        Cheap token that changes when another process modifies the stored data
+        (writes made through this instance may or may not change it)
+        """
+        raise NotImplementedError
+
+    def incidents_version(self) -> Any:
+        """Like version(), but only for incidents"""
+        return self.version()
+
+    @abc.abstractmethod
+    def size_bytes(self) -> int:
+        """Bytes taken by the stored data"""
+        raise NotImplementedError
+
+    # Monitors
+    @abc.abstractmethod
+    def list_monitors(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_monitor(self, monitor_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create_monitor(self, monitor: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def modify_monitor(self, monitor_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        """Atomically read, mutate and store one monitor (None if it doesn't exist)"""
+        raise NotImplementedError
+
+    def update_monitor(self, monitor_id: str, fields: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self.modify_monitor(monitor_id, _updater(fields, if_match))
+
+    @abc.abstractmethod
+    def delete_monitor(self, monitor_id: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def replace_monitors(self, monitors: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    # Incidents
+    @abc.abstractmethod
+    def list_incidents(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_incidents_since(self, since: datetime) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def page_incidents(self, filters: IncidentFilter, after: Optional[IncidentKey] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Up to `limit` incidents matching `filters`, newest first, starting after `after`"""
+        raise NotImplementedError
+
+    def iter_incidents_ndjson(self, filters: IncidentFilter, batch_size: int = 500) -> Iterator[bytes]:
+        """
+        Every incident matching `filters`, newest first, as NDJSON. Reads
+        `batch_size` incidents at a time and yields one chunk per batch.
+        """
+        after = None
+        while True:
+            page = self.page_incidents(filters, after, batch_size)
+            if page:
+                yield _ndjson(json.dumps(incident, ensure_ascii=False) for incident in page)
+            if len(page) < batch_size:
+                return
+            after = incident_key(page[-1])
+
+    @abc.abstractmethod
+    def get_incident(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create_incident(self, incident: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def modify_incident(self, incident_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        """Atomically read, mutate and store one incident (None if it doesn't exist)"""
+        raise NotImplementedError
+
+    def update_incident(self, incident_id: str, fields: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self.modify_incident(incident_id, _updater(fields, if_match))
+
+    @abc.abstractmethod
+    def upsert_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        """
+        Create or modify several incidents in a single write (one transaction,
+        or one file rewrite). Returns the incidents that were written.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def upsert_open_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        """
+        Like upsert_incidents, but keyed by incident id prefix: each upsert gets
+        the most recent unresolved incident whose id starts with the prefix (or
+        None) and may return a new incident with its own id (suffixed with -2,
+        -3, ... if a resolved incident already has it). The lookup and the
+        write share one transaction (or file lock), so concurrent writers agree
+        on which incident is open.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_incident(self, incident_id: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def replace_incidents(self, incidents: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+
+class JSONFileStorage(Storage):
+    """
+    Legacy backend: every call reads (and every write rewrites) the whole JSON file.
+    Writes hold a cross-process file lock for the whole read-modify-write.
+    """
+
+    BACKEND = "json"
+
+    def __init__(self, monitors_file: str = MONITORS_FILE, incidents_file: str = INCIDENTS_FILE):
+        self.monitors_file = monitors_file
+        self.incidents_file = incidents_file
+
+    def version(self) -> Any:
+        versions = []
+        for filename in (self.monitors_file, self.incidents_file):
+            try:
+                st = os.stat(filename)
+                versions.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                versions.append(None)
+        return tuple(versions)
+
+    def size_bytes(self) -> int:
+        return sum(
+            os.path.getsize(filename) for filename in (self.monitors_file, self.incidents_file)
+            if os.path.exists(filename)
+        )
+
+    @timed()
+    def list_monitors(self) -> List[Dict[str, Any]]:
+        return read_json_file(self.monitors_file)
+
+    @timed()
+    def get_monitor(self, monitor_id: str) -> Optional[Dict[str, Any]]:
+        for monitor in read_json_file(self.monitors_file):
+            if monitor.get("url_monitor") == monitor_id:
+                return monitor
+        return None
+
+    @timed()
+    def create_monitor(self, monitor: Dict[str, Any]) -> Dict[str, Any]:
+        with locked_file(self.monitors_file):
+            monitors = read_json_file(self.monitors_file)
+            if any(m.get("url_monitor") == monitor["url_monitor"] for m in monitors):
+                raise ConflictError(monitor["url_monitor"])
+            monitors.append(monitor)
+            write_json_file(self.monitors_file, monitors)
+        return monitor
+
+    @timed()
+    def modify_monitor(self, monitor_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        with locked_file(self.monitors_file):
+            monitors = read_json_file(self.monitors_file)
+            for i, monitor in enumerate(monitors):
+                if monitor.get("url_monitor") == monitor_id:
+                    updated = mutate(dict(monitor))
+                    new_id = updated.get("url_monitor", monitor_id)
+                    if new_id != monitor_id and any(m.get("url_monitor") == new_id for m in monitors):
+                        raise ConflictError(new_id)
+                    monitors[i] = updated
+                    write_json_file(self.monitors_file, monitors)
+                    return updated
+        return None
+
+    @timed()
+    def delete_monitor(self, monitor_id: str) -> bool:
+        with locked_file(self.monitors_file):
+            monitors = read_json_file(self.monitors_file)
+            remaining = [m for m in monitors if m.get("url_monitor") != monitor_id]
+            if len(remaining) == len(monitors):
+                return False
+            write_json_file(self.monitors_file, remaining)
+        return True
+
+    @timed()
+    def replace_monitors(self, monitors: List[Dict[str, Any]]):
+        with locked_file(self.monitors_file):
+            write_json_file(self.monitors_file, monitors)
+
+    @timed()
+    def list_incidents(self) -> List[Dict[str, Any]]:
+        return read_json_file(self.incidents_file)
+
+    @timed()
+    def list_incidents_since(self, since: datetime) -> List[Dict[str, Any]]:
+        cutoff = since.timestamp()
+        return [
+            inc for inc in read_json_file(self.incidents_file)
+            if (parse_timestamp(inc.get("created_at")) or 0) >= cutoff
+        ]
+
+    @timed()
+    def page_incidents(self, filters: IncidentFilter, after: Optional[IncidentKey] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        # No indexes here: the whole file is read, filtered and sorted on every page
+        matching = [
+            inc for inc in read_json_file(self.incidents_file)
+            if filters.matches(inc) and (after is None or incident_key(inc) < after)
+        ]
+        matching.sort(key=incident_key, reverse=True)
+        return matching[:limit]
+
+    def iter_incidents_ndjson(self, filters: IncidentFilter, batch_size: int = 500) -> Iterator[bytes]:
+        # The file is loaded whole anyway: read it once instead of once per batch
+        matching = self.page_incidents(filters, limit=sys.maxsize)
+        for start in range(0, len(matching), batch_size):
+            yield _ndjson(json.dumps(incident, ensure_ascii=False) for incident in matching[start:start + batch_size])
+
+    @timed()
+    def get_incident(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        for incident in read_json_file(self.incidents_file):
+            if incident.get("id") == incident_id:
+                return incident
+        return None
+
+    @timed()
+    def create_incident(self, incident: Dict[str, Any]) -> Dict[str, Any]:
+        with locked_file(self.incidents_file):
+            incidents = read_json_file(self.incidents_file)
+            if any(i.get("id") == incident["id"] for i in incidents):
+                raise ConflictError(incident["id"])
+            incidents.append(incident)
+            write_json_file(self.incidents_file, incidents)
+        return incident
+
+    @timed()
+    def modify_incident(self, incident_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        with locked_file(self.incidents_file):
+            incidents = read_json_file(self.incidents_file)
+            for i, incident in enumerate(incidents):
+                if incident.get("id") == incident_id:
+                    incidents[i] = mutate(dict(incident))
+                    write_json_file(self.incidents_file, incidents)
+                    return incidents[i]
+        return None
+
+    @timed()
+    def upsert_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        written = []
+        with locked_file(self.incidents_file):
+            incidents = read_json_file(self.incidents_file)
+            positions = {incident.get("id"): i for i, incident in enumerate(incidents)}
+            for incident_id, upsert in changes.items():
+                position = positions.get(incident_id)
+                current = dict(incidents[position]) if position is not None else None
+                incident = upsert(current)
+                if incident is None:
+                    continue
+                if position is None:
+                    positions[incident_id] = len(incidents)
+                    incidents.append(incident)
+                else:
+                    incidents[position] = incident
+                written.append(incident)
+            if written:
+                write_json_file(self.incidents_file, incidents)
+        return written
+
+    @timed()
+    def upsert_open_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        written = []
+        with locked_file(self.incidents_file):
+            incidents = read_json_file(self.incidents_file)
+            positions = {incident.get("id"): i for i, incident in enumerate(incidents)}
+            for prefix, upsert in changes.items():
+                open_positions = [
+                    i for i, incident in enumerate(incidents)
+                    if str(incident.get("id", "")).startswith(prefix) and incident.get("status") != "resolved"
+                ]
+                position = max(open_positions, key=lambda i: incident_key(incidents[i]), default=None)
+                current = dict(incidents[position]) if position is not None else None
+                incident = upsert(current)
+                if incident is None:
+                    continue
+                if position is None:
+                    incident["id"] = _unused_id(incident["id"], positions.__contains__)
+                    positions[incident["id"]] = len(incidents)
+                    incidents.append(incident)
+                else:
+                    incidents[position] = incident
+                written.append(incident)
+            if written:
+                write_json_file(self.incidents_file, incidents)
+        return written
+
+    @timed()
+    def delete_incident(self, incident_id: str) -> bool:
+        with locked_file(self.incidents_file):
+            incidents = read_json_file(self.incidents_file)
+            remaining = [i for i in incidents if i.get("id") != incident_id]
+            if len(remaining) == len(incidents):
+                return False
+            write_json_file(self.incidents_file, remaining)
+        return True
+
+    @timed()
+    def replace_incidents(self, incidents: List[Dict[str, Any]]):
+        with locked_file(self.incidents_file):
+            write_json_file(self.incidents_file, incidents)
+
+
+class SQLiteStorage(Storage):
+    """
+    SQLite backend in WAL mode. Rows keep insertion order (seq) so listings
+    match the order of the original JSON files.
+    """
+
+    BACKEND = "sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS monitors ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " url_monitor TEXT NOT NULL UNIQUE,"
+        " data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS incidents ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " id TEXT NOT NULL UNIQUE,"
+        " created_ts REAL,"
+        " status TEXT,"
+        " severity TEXT,"
+        " data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS incident_services ("
+        " service TEXT NOT NULL,"
+        " incident_id TEXT NOT NULL,"
+        " PRIMARY KEY (service, incident_id)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_incident_services_incident ON incident_services (incident_id)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        # Bumped once per write transaction, so every connection sees the same version
+        "CREATE TABLE IF NOT EXISTS generations (kind TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO generations (kind, value) VALUES ('incidents', 0), ('monitors', 0)",
+    ]
+
+    # Listings are ordered by (created_ts, id) and filtered by status / severity;
+    # created after _migrate() since older databases lack those columns
+    INDEXES = [
+        "DROP INDEX IF EXISTS idx_incidents_created_ts",
+        "CREATE INDEX IF NOT EXISTS idx_incidents_created ON incidents (created_ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status, created_ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_incidents_severity ON incidents (severity, created_ts, id)",
+    ]
+
+    def __init__(self, path: str, monitors_file: str = MONITORS_FILE, incidents_file: str = INCIDENTS_FILE):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        self._migrate()
+        for statement in self.INDEXES:
+            conn.execute(statement)
+        self._import_once("monitors", monitors_file, self._write_monitors)
+        self._import_once("incidents", incidents_file, self._write_incidents)
+
+    def _migrate(self):
+        """Add the listing columns and service index to databases created before they existed"""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'indexed_incidents'").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(incidents)")}
+            for column in ("status", "severity"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE incidents ADD COLUMN {column} TEXT")
+            rows = conn.execute("SELECT id, data FROM incidents").fetchall()
+            for incident_id, data in rows:
+                self._write_incident(conn, json.loads(data), incident_id)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed_incidents', '1')")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if rows:
+            logger.info(f"Indexed {len(rows)} incidents in {self.path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _import_once(self, kind: str, filename: str, write: Callable[[sqlite3.Connection, List[Dict[str, Any]]], None]):
+        """
+        Seed an empty table from its JSON file the first time the database is
+        used. The check and the import share one write transaction, so workers
+        starting together import the file once.
+        """
+        conn = self._conn()
+        flag = f"imported_{kind}"
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (flag,)).fetchone():
+            return
+        data = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have imported while we waited for the lock
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (flag,)).fetchone():
+                conn.execute("ROLLBACK")
+                return
+            if os.path.exists(filename):
+                data = read_json_file(filename)
+                write(conn, data)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (flag,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if data is not None:
+            logger.info(f"Imported {len(data)} {kind} from {filename} into {self.path}")
+
+    def version(self) -> Any:
+        # Unlike PRAGMA data_version, comparable across connections (threads and processes)
+        return tuple(row[0] for row in self._conn().execute("SELECT value FROM generations ORDER BY kind"))
+
+    def incidents_version(self) -> Any:
+        return self._conn().execute("SELECT value FROM generations WHERE kind = 'incidents'").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        conn = self._conn()
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, kind: str):
+        """Count a write to monitors or incidents (call inside its transaction)"""
+        conn.execute("UPDATE generations SET value = value + 1 WHERE kind = ?", (kind,))
+
+    @staticmethod
+    def _encode(item: Dict[str, Any]) -> str:
+        return json.dumps(item, ensure_ascii=False)
+
+    # Monitors
+    @timed()
+    def list_monitors(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM monitors ORDER BY seq").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @timed()
+    def get_monitor(self, monitor_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM monitors WHERE url_monitor = ?", (monitor_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed()
+    def create_monitor(self, monitor: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO monitors (url_monitor, data) VALUES (?, ?)",
+                (monitor["url_monitor"], self._encode(monitor)),
+            )
+            self._bump(conn, "monitors")
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            raise ConflictError(monitor["url_monitor"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return monitor
+
+    @timed()
+    def modify_monitor(self, monitor_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        # BEGIN IMMEDIATE takes the write lock up front, serializing writers across processes
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM monitors WHERE url_monitor = ?", (monitor_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            monitor = mutate(json.loads(row[0]))
+            conn.execute(
+                "UPDATE monitors SET url_monitor = ?, data = ? WHERE url_monitor = ?",
+                (monitor["url_monitor"], self._encode(monitor), monitor_id),
+            )
+            self._bump(conn, "monitors")
+            conn.execute("COMMIT")
+            return monitor
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            raise ConflictError(monitor["url_monitor"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed()
+    def delete_monitor(self, monitor_id: str) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute("DELETE FROM monitors WHERE url_monitor = ?", (monitor_id,))
+            if cursor.rowcount > 0:
+                self._bump(conn, "monitors")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    @timed()
+    def replace_monitors(self, monitors: List[Dict[str, Any]]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_monitors(conn, monitors)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write_monitors(self, conn: sqlite3.Connection, monitors: List[Dict[str, Any]]):
+        """Replace every stored monitor (call inside a transaction)"""
+        conn.execute("DELETE FROM monitors")
+        conn.executemany(
+            "INSERT OR REPLACE INTO monitors (url_monitor, data) VALUES (?, ?)",
+            [(m["url_monitor"], self._encode(m)) for m in monitors],
+        )
+        self._bump(conn, "monitors")
+
+    # Incidents
+    def _write_incident(self, conn: sqlite3.Connection, incident: Dict[str, Any], incident_id: Optional[str] = None):
+        """
+        Insert `incident`, or update the row stored as `incident_id`, keeping
+        the listing columns and service index in sync (call inside a transaction)
+        """
+        columns = (incident_key(incident)[0], incident.get("status"), incident.get("severity"), self._encode(incident))
+        if incident_id is None:
+            incident_id = incident["id"]
+            conn.execute(
+                "INSERT INTO incidents (id, created_ts, status, severity, data) VALUES (?, ?, ?, ?, ?)",
+                (incident_id,) + columns,
+            )
+        else:
+            conn.execute(
+                "UPDATE incidents SET created_ts = ?, status = ?, severity = ?, data = ? WHERE id = ?",
+                columns + (incident_id,),
+            )
+            conn.execute("DELETE FROM incident_services WHERE incident_id = ?", (incident_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO incident_services (service, incident_id) VALUES (?, ?)",
+            [(service, incident_id) for service in incident.get("affected_services") or []],
+        )
+
+    @timed()
+    def list_incidents(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM incidents ORDER BY seq").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @timed()
+    def list_incidents_since(self, since: datetime) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT data FROM incidents WHERE created_ts >= ? ORDER BY seq",
+            (since.timestamp(),),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @timed("page_incidents")
+    def _page_rows(self, filters: IncidentFilter, after: Optional[IncidentKey], limit: int) -> List[Tuple[float, str, str]]:
+        """(created_ts, id, data) of one page; every filter is served by an index"""
+        where, params = [], []
+        if filters.status:
+            where.append(f"status IN ({', '.join('?' * len(filters.status))})")
+            params.extend(filters.status)
+        if filters.severity:
+            where.append(f"severity IN ({', '.join('?' * len(filters.severity))})")
+            params.extend(filters.severity)
+        if filters.service is not None:
+            where.append("id IN (SELECT incident_id FROM incident_services WHERE service = ?)")
+            params.append(filters.service)
+        if filters.since is not None:
+            where.append("created_ts >= ?")
+            params.append(filters.since)
+        if filters.until is not None:
+            where.append("created_ts < ?")
+            params.append(filters.until)
+        if after is not None:
+            where.append("(created_ts < ? OR (created_ts = ? AND id < ?))")
+            params.extend((after[0], after[0], after[1]))
+        sql = "SELECT created_ts, id, data FROM incidents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_ts DESC, id DESC LIMIT ?"
+        return self._conn().execute(sql, params + [limit]).fetchall()
+
+    def page_incidents(self, filters: IncidentFilter, after: Optional[IncidentKey] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        return [json.loads(row[2]) for row in self._page_rows(filters, after, limit)]
+
+    def iter_incidents_ndjson(self, filters: IncidentFilter, batch_size: int = 500) -> Iterator[bytes]:
+        # Stored rows already are compact JSON: join them without decoding. Each
+        # batch is its own query, so no read transaction stays open while the
+        # client consumes the stream (and batches may run on different threads).
+        after = None
+        while True:
+            rows = self._page_rows(filters, after, batch_size)
+            if rows:
+                yield _ndjson(row[2] for row in rows)
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][0], rows[-1][1])
+
+    @timed()
+    def get_incident(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed()
+    def create_incident(self, incident: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_incident(conn, incident)
+            self._bump(conn, "incidents")
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            raise ConflictError(incident["id"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return incident
+
+    @timed()
+    def modify_incident(self, incident_id: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            incident = mutate(json.loads(row[0]))
+            self._write_incident(conn, incident, incident_id)
+            self._bump(conn, "incidents")
+            conn.execute("COMMIT")
+            return incident
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed()
+    def upsert_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        written = []
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for incident_id, upsert in changes.items():
+                row = conn.execute("SELECT data FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+                incident = upsert(json.loads(row[0]) if row else None)
+                if incident is None:
+                    continue
+                self._write_incident(conn, incident, incident_id if row else None)
+                written.append(incident)
+            if written:
+                self._bump(conn, "incidents")
+            conn.execute("COMMIT")
+            return written
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed()
+    def upsert_open_incidents(self, changes: Dict[str, Upsert]) -> List[Dict[str, Any]]:
+        written = []
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for prefix, upsert in changes.items():
+                row = conn.execute(
+                    "SELECT id, data FROM incidents"
+                    " WHERE substr(id, 1, ?) = ? AND COALESCE(status, '') != 'resolved'"
+                    " ORDER BY created_ts DESC, id DESC LIMIT 1",
+                    (len(prefix), prefix),
+                ).fetchone()
+                incident = upsert(json.loads(row[1]) if row else None)
+                if incident is None:
+                    continue
+                if row is None:
+                    incident["id"] = _unused_id(
+                        incident["id"],
+                        lambda candidate: conn.execute("SELECT 1 FROM incidents WHERE id = ?", (candidate,)).fetchone() is not None,
+                    )
+                    self._write_incident(conn, incident)
+                else:
+                    self._write_incident(conn, incident, row[0])
+                written.append(incident)
+            if written:
+                self._bump(conn, "incidents")
+            conn.execute("COMMIT")
+            return written
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed()
+    def delete_incident(self, incident_id: str) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute("DELETE FROM incidents WHERE id = ?", (incident_id,))
+            conn.execute("DELETE FROM incident_services WHERE incident_id = ?", (incident_id,))
+            if cursor.rowcount > 0:
+                self._bump(conn, "incidents")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    @timed()
+    def replace_incidents(self, incidents: List[Dict[str, Any]]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_incidents(conn, incidents)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write_incidents(self, conn: sqlite3.Connection, incidents: List[Dict[str, Any]]):
+        """Replace every stored incident (call inside a transaction)"""
+        conn.execute("DELETE FROM incidents")
+        conn.execute("DELETE FROM incident_services")
+        # Later duplicates replace earlier ones, as INSERT OR REPLACE did
+        by_id = {incident["id"]: incident for incident in incidents}
+        for incident in by_id.values():
+            self._write_incident(conn, incident)
+        self._bump(conn, "incidents")
+
+
+def create_storage() -> Storage:
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if config.STORAGE_BACKEND == "json":
+        logger.info("Using JSON file storage")
+        return JSONFileStorage()
+    logger.info(f"Using SQLite storage at {config.STORAGE_PATH}")
+    return SQLiteStorage(config.STORAGE_PATH)
+
+
+def export_json(storage: Storage, monitors_file: str = MONITORS_FILE, incidents_file: str = INCIDENTS_FILE):
+    """Write the stored monitors and incidents to their JSON files"""
+    with locked_file(monitors_file):
+        write_json_file(monitors_file, storage.list_monitors())
+    with locked_file(incidents_file):
+        write_json_file(incidents_file, storage.list_incidents())
+
+
+def import_json(storage: Storage, monitors_file: str = MONITORS_FILE, incidents_file: str = INCIDENTS_FILE):
+    """Replace the stored monitors and incidents with the contents of the JSON files"""
+    storage.replace_monitors(read_json_file(monitors_file))
+    storage.replace_incidents(read_json_file(incidents_file))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "export":
+        export_json(create_storage())
+    elif command == "import":
+        import_json(create_storage())
+    else:
+        print("Usage: python -m app.storage [export|import]")
+        sys.exit(1)
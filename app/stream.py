@@ -0,0 +1,161 @@
+"""
+Server-Sent Events stream of status changes (/api/stream)
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from app.incidents_view import RecentIncidentsView
+from app.poller import StatusPoller
+from app.responses import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+def encode_event(event: str, data: Any) -> bytes:
+    """Encode one SSE message"""
+    return b"event: " + event.encode("ascii") + b"\ndata: " + encode_json(data) + b"\n\n"
+
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+class StatusStream:
+    """
+    Fans out status changes to every connected SSE client.
+
+    A single background task compares the poller snapshot and the recent
+    incidents view against what was last broadcast (every `check_interval`
+    seconds, or immediately after notify()). Each change is encoded once and
+    the same bytes are queued for every subscriber. Clients that fall
+    `queue_size` messages behind are disconnected and resync on reconnect.
+    """
+
+    def __init__(
+        self,
+        poller: StatusPoller,
+        incidents: RecentIncidentsView,
+        check_interval: float = 0.5,
+        queue_size: int = 100,
+    ):
+        self.poller = poller
+        self.incidents = incidents
+        self.check_interval = check_interval
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._monitors: Dict[int, Dict[str, Any]] = {}
+        self._overall: Optional[str] = None
+        self._snapshot_etag: Optional[str] = None
+        self._incidents: Dict[str, Dict[str, Any]] = {}
+        self._incidents_etag: Optional[str] = None
+        self._initial: Optional[bytes] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def notify(self):
+        """Check for changes now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _broadcast(self, payload: bytes):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Too slow: drop the client, it will reconnect and get a fresh snapshot
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue):
+        """Disconnect a subscriber: its pending messages are replaced by the end marker"""
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def initial_event(self) -> bytes:
+        """Full state sent to a client when it connects"""
+        self._check()
+        if self._initial is None:
+            snapshot = await self.poller.get_snapshot()
+            self._check()
+            self._initial = b"retry: 5000\n" + encode_event("snapshot", {
+                "monitors": snapshot.monitors,
+                "status": {"status": snapshot.overall, "updated_at": snapshot.updated_at},
+                "incidents": list(self._incidents.values()),
+            })
+        return self._initial
+
+    def _check(self):
+        """Broadcast whatever changed since the last check"""
+        snapshot = self.poller.snapshot
+        if snapshot is not None and snapshot.etag != self._snapshot_etag:
+            monitors = {m["id"]: m for m in snapshot.monitors}
+            if self._snapshot_etag is not None:
+                for monitor_id, monitor in monitors.items():
+                    if self._monitors.get(monitor_id) != monitor:
+                        self._broadcast(encode_event("monitor", monitor))
+                for monitor_id in self._monitors.keys() - monitors.keys():
+                    self._broadcast(encode_event("monitor_deleted", {"id": monitor_id}))
+                if snapshot.overall != self._overall:
+                    self._broadcast(encode_event("status", {
+                        "status": snapshot.overall,
+                        "updated_at": snapshot.updated_at
+                    }))
+            self._monitors = monitors
+            self._overall = snapshot.overall
+            self._snapshot_etag = snapshot.etag
+            self._initial = None
+
+        body = self.incidents.body()
+        if body.etag != self._incidents_etag:
+            incidents = {i["id"]: i for i in self.incidents.incidents()}
+            if self._incidents_etag is not None:
+                for incident_id, incident in incidents.items():
+                    if self._incidents.get(incident_id) != incident:
+                        self._broadcast(encode_event("incident", incident))
+                for incident_id in self._incidents.keys() - incidents.keys():
+                    self._broadcast(encode_event("incident_deleted", {"id": incident_id}))
+            self._incidents = incidents
+            self._incidents_etag = body.etag
+            self._initial = None
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            if self._subscribers:
+                try:
+                    self._check()
+                except Exception as e:
+                    logger.error(f"Error checking for stream updates: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the change detection loop (called from the app startup hook)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and disconnect every client (called from the app shutdown hook)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in list(self._subscribers):
+            self._close(queue)
@@ -0,0 +1,278 @@
+"""
+Monitor uptime history: run-length encoded state transitions plus hourly and
+daily rollups, stored in a SQLite file
+"""
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+
+# Rollup columns per Datadog state; anything else (No Data, Skipped, failed lookups) is "no_data"
+STATE_COLUMNS = {"OK": "ok", "Warn": "warn", "Alert": "alert"}
+COLUMNS = ("ok", "warn", "alert", "no_data")
+
+
+def _column(state: str) -> str:
+    return STATE_COLUMNS.get(state, "no_data")
+
+
+def uptime_percent(seconds: Dict[str, float]) -> Optional[float]:
+    """Share of time with data that the monitor was up (OK or Warn); None without data"""
+    known = seconds["ok"] + seconds["warn"] + seconds["alert"]
+    if known <= 0:
+        return None
+    return round(100.0 * (seconds["ok"] + seconds["warn"]) / known, 3)
+
+
+def worst_state(seconds: Dict[str, float]) -> str:
+    """Most severe state seen in a bucket (used to color uptime bars)"""
+    for column, state in (("alert", "Alert"), ("warn", "Warn"), ("ok", "OK")):
+        if seconds[column] > 0:
+            return state
+    return "No Data"
+
+
+class UptimeStore:
+    """
+    Records the state of every monitor after each poll.
+
+    Only changes are stored as rows in `transitions` (run-length encoding).
+    The time since the previous record is added to per-state seconds in
+    hourly and daily rollups, so an uptime query reads one row per bucket.
+    Each monitor keeps an `accounted_until` cursor, updated in the same
+    transaction, so concurrent recorders never count the same interval twice.
+    Gaps longer than `max_gap` (e.g. the app was down) count as no data.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_gap: float = 300.0,
+        transitions_retention_days: int = 90,
+        hourly_retention_days: int = 14,
+        daily_retention_days: int = 400,
+    ):
+        self.path = path
+        self.max_gap = max_gap
+        self.transitions_retention = transitions_retention_days * DAY
+        self.hourly_retention = hourly_retention_days * DAY
+        self.daily_retention = daily_retention_days * DAY
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS monitor_state ("
+            " monitor_id INTEGER PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " since REAL NOT NULL,"
+            " accounted_until REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transitions ("
+            " monitor_id INTEGER NOT NULL,"
+            " started_at REAL NOT NULL,"
+            " state TEXT NOT NULL,"
+            " PRIMARY KEY (monitor_id, started_at)) WITHOUT ROWID"
+        )
+        for table in ("uptime_hourly", "uptime_daily"):
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " monitor_id INTEGER NOT NULL,"
+                " bucket REAL NOT NULL,"
+                " ok REAL NOT NULL DEFAULT 0,"
+                " warn REAL NOT NULL DEFAULT 0,"
+                " alert REAL NOT NULL DEFAULT 0,"
+                " no_data REAL NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (monitor_id, bucket)) WITHOUT ROWID"
+            )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS generation (value INTEGER NOT NULL)")
+        self._conn.execute("INSERT INTO generation (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM generation)")
+        logger.info(f"Uptime history opened at {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _add_seconds(self, monitor_id: int, column: str, start: float, end: float):
+        """Spread [start, end) over the hourly and daily buckets it overlaps"""
+        for table, size in (("uptime_hourly", HOUR), ("uptime_daily", DAY)):
+            bucket = start - start % size
+            while bucket < end:
+                seconds = min(end, bucket + size) - max(start, bucket)
+                self._conn.execute(
+                    f"INSERT INTO {table} (monitor_id, bucket, {column}) VALUES (?, ?, ?) "
+                    f"ON CONFLICT(monitor_id, bucket) DO UPDATE SET {column} = {column} + excluded.{column}",
+                    (monitor_id, bucket, seconds),
+                )
+                bucket += size
+
+    def record(self, states: Dict[int, str], now: Optional[float] = None):
+        """Record the current state of each monitor (called after every poll)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for monitor_id, state in states.items():
+                    row = self._conn.execute(
+                        "SELECT state, accounted_until FROM monitor_state WHERE monitor_id = ?", (monitor_id,)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute(
+                            "INSERT INTO monitor_state (monitor_id, state, since, accounted_until) VALUES (?, ?, ?, ?)",
+                            (monitor_id, state, now, now),
+                        )
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO transitions (monitor_id, started_at, state) VALUES (?, ?, ?)",
+                            (monitor_id, now, state),
+                        )
+                        continue
+
+                    previous, accounted_until = row
+                    if now <= accounted_until:
+                        continue
+                    if now - accounted_until > self.max_gap:
+                        # Nobody was polling: we don't know what happened
+                        self._add_seconds(monitor_id, "no_data", accounted_until, now)
+                    else:
+                        # The previous state lasted until this poll
+                        self._add_seconds(monitor_id, _column(previous), accounted_until, now)
+
+                    if state != previous:
+                        self._conn.execute(
+                            "UPDATE monitor_state SET state = ?, since = ?, accounted_until = ? WHERE monitor_id = ?",
+                            (state, now, now, monitor_id),
+                        )
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO transitions (monitor_id, started_at, state) VALUES (?, ?, ?)",
+                            (monitor_id, now, state),
+                        )
+                    else:
+                        self._conn.execute(
+                            "UPDATE monitor_state SET accounted_until = ? WHERE monitor_id = ?",
+                            (now, monitor_id),
+                        )
+                self._bump()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if now - self._pruned_at >= HOUR:
+            self.prune(now)
+
+    def prune(self, now: Optional[float] = None):
+        """Drop transitions and rollups older than their retention"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM transitions WHERE started_at < ?", (now - self.transitions_retention,))
+                self._conn.execute("DELETE FROM uptime_hourly WHERE bucket < ?", (now - self.hourly_retention,))
+                self._conn.execute("DELETE FROM uptime_daily WHERE bucket < ?", (now - self.daily_retention,))
+                self._bump()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._pruned_at = now
+
+    def _bump(self):
+        """Count a write to the history (call inside its transaction)"""
+        self._conn.execute("UPDATE generation SET value = value + 1")
+
+    def version(self) -> int:
+        """Write counter of the history, the same in every process (bumped by record and prune)"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM generation").fetchone()[0]
+
+    def buckets(self, monitor_id: int, count: int, resolution: str = "day", now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Uptime for the last `count` days (or hours), oldest first, one entry per
+        bucket including buckets without data. The current, still-open run is
+        included up to `now`.
+        """
+        return self.buckets_many([monitor_id], count, resolution, now)[monitor_id]
+
+    def buckets_many(
+        self, monitor_ids: List[int], count: int, resolution: str = "day", now: Optional[float] = None
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """buckets() for several monitors, read in one query per table"""
+        size = DAY if resolution == "day" else HOUR
+        table = "uptime_daily" if resolution == "day" else "uptime_hourly"
+        now = time.time() if now is None else now
+        current = now - now % size
+        first = current - (count - 1) * size
+        monitor_ids = list(dict.fromkeys(monitor_ids))
+        placeholders = ", ".join("?" * len(monitor_ids))
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT monitor_id, bucket, ok, warn, alert, no_data FROM {table} "
+                f"WHERE monitor_id IN ({placeholders}) AND bucket >= ?",
+                (*monitor_ids, first),
+            ).fetchall() if monitor_ids else []
+            open_runs = self._conn.execute(
+                f"SELECT monitor_id, state, accounted_until FROM monitor_state WHERE monitor_id IN ({placeholders})",
+                monitor_ids,
+            ).fetchall() if monitor_ids else []
+
+        by_monitor: Dict[int, Dict[float, Dict[str, float]]] = {monitor_id: {} for monitor_id in monitor_ids}
+        for row in rows:
+            by_monitor[row[0]][row[1]] = dict(zip(COLUMNS, row[2:]))
+        for monitor_id, state, start in open_runs:
+            if now - start > self.max_gap:
+                continue
+            # Time since the last poll, not yet in the rollups
+            by_bucket = by_monitor[monitor_id]
+            bucket = start - start % size
+            while bucket < now:
+                seconds = min(now, bucket + size) - max(start, bucket)
+                entry = by_bucket.setdefault(bucket, dict.fromkeys(COLUMNS, 0.0))
+                entry[_column(state)] += seconds
+                bucket += size
+
+        starts = [first + i * size for i in range(count)]
+        labels = [datetime.fromtimestamp(bucket, tz=timezone.utc).isoformat() for bucket in starts]
+        result = {}
+        for monitor_id, by_bucket in by_monitor.items():
+            entries = []
+            for bucket, label in zip(starts, labels):
+                seconds = by_bucket.get(bucket, dict.fromkeys(COLUMNS, 0.0))
+                entries.append({
+                    "start": label,
+                    "uptime_percent": uptime_percent(seconds),
+                    "worst_state": worst_state(seconds),
+                    "seconds": {column: round(value, 3) for column, value in seconds.items()},
+                })
+            result[monitor_id] = entries
+        return result
+
+    def transitions(self, monitor_id: int, since: float) -> List[Dict[str, Any]]:
+        """State changes of a monitor since `since`, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT started_at, state FROM transitions WHERE monitor_id = ? AND started_at >= ? ORDER BY started_at",
+                (monitor_id, since),
+            ).fetchall()
+        return [
+            {"at": datetime.fromtimestamp(started_at, tz=timezone.utc).isoformat(), "state": state}
+            for started_at, state in rows
+        ]
+
+
+def open_uptime_store(path: str, **kwargs) -> Optional[UptimeStore]:
+    """Open the uptime history store, or return None (history disabled) if it can't be opened"""
+    try:
+        return UptimeStore(path, **kwargs)
+    except sqlite3.Error as e:
+        logger.error(f"Could not open uptime history at {path}, uptime will not be recorded: {e}")
+        return None
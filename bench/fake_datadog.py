@@ -0,0 +1,194 @@
+"""
+Local stand-in for the Datadog API used by the benchmark harness.
+
+Serves the endpoints the app calls (/api/v1/monitor/{id}, /api/v1/monitor
+with monitor_ids, /api/v1/events) for monitors 1..monitor_count, with
+configurable latency, error rate and 429 rate. Counters of every call are
+served at /_stats and cleared with POST /_reset.
+
+    python -m bench.fake_datadog --port 8125 --monitors 200 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+STATES = ["OK"] * 18 + ["Warn", "Alert"]
+
+
+class FakeDatadog:
+    """Behaviour and call counters of the fake API (shared by all handler threads)"""
+
+    def __init__(
+        self,
+        monitor_count: int = 100,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rate_limit_reset: float = 1.0,
+        seed: int = 0,
+    ):
+        self.monitor_count = monitor_count
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_reset = rate_limit_reset
+        rng = random.Random(seed)
+        self.states = {i: rng.choice(STATES) for i in range(1, monitor_count + 1)}
+        self._random = random.Random(seed + 1)
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+
+    def count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = dict(self.calls)
+        endpoints = {k: v for k, v in calls.items() if not k.startswith("status_")}
+        return {"total": sum(endpoints.values()), "calls": calls}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def outcome(self) -> int:
+        """Status code of the next call: 429, 500 or 200"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return 200
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        seconds = max(0.0, self.latency_ms + jitter) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def monitor(self, monitor_id: int) -> dict:
+        return {"id": monitor_id, "name": f"Monitor {monitor_id}", "overall_state": self.states[monitor_id]}
+
+
+def make_handler(api: FakeDatadog):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path == "/_reset":
+                api.reset()
+                return self._send(200, {"reset": True})
+            self._send(404, {"errors": ["Not found"]})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path == "/_stats":
+                return self._send(200, api.stats())
+
+            if url.path == "/api/v1/monitor":
+                name = "monitor_bulk"
+            elif url.path.startswith("/api/v1/monitor/"):
+                name = "monitor"
+            elif url.path == "/api/v1/events":
+                name = "events"
+            else:
+                return self._send(404, {"errors": ["Not found"]})
+
+            api.count(name)
+            api.delay()
+            status = api.outcome()
+            api.count(f"status_{status}")
+            if status == 429:
+                return self._send(429, {"errors": ["Rate limit exceeded"]}, {
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(api.rate_limit_reset),
+                })
+            if status == 500:
+                return self._send(500, {"errors": ["Internal Server Error"]})
+
+            if name == "monitor":
+                try:
+                    monitor_id = int(url.path.rsplit("/", 1)[-1])
+                except ValueError:
+                    return self._send(400, {"errors": ["Invalid monitor id"]})
+                if monitor_id not in api.states:
+                    return self._send(404, {"errors": ["Monitor not found"]})
+                return self._send(200, api.monitor(monitor_id))
+            if name == "monitor_bulk":
+                ids = [i for i in params.get("monitor_ids", [""])[0].split(",") if i.isdigit()]
+                return self._send(200, [api.monitor(int(i)) for i in ids if int(i) in api.states])
+            return self._send(200, {"events": []})
+
+    return Handler
+
+
+def serve(api: FakeDatadog, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake API in a background thread; the bound port is server.server_port"""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--monitors", type=int, default=100, help="Number of monitors (IDs 1..N)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Added latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Random +/- variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--rate-limit-reset", type=float, default=1.0, help="X-RateLimit-Reset of 429 responses")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for monitor states and failures")
+
+
+def from_arguments(args: argparse.Namespace) -> FakeDatadog:
+    return FakeDatadog(
+        monitor_count=args.monitors,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rate_limit_reset=args.rate_limit_reset,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Fake Datadog API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8125)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(from_arguments(args), args.host, args.port)
+    logger.info(f"Fake Datadog API listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,364 @@
+"""
+Benchmark / load test of the status page API against a local fake Datadog.
+
+Starts the fake Datadog API (bench.fake_datadog) and the app (uvicorn, in a
+temporary data directory seeded with `--monitors` monitors and `--incidents`
+incidents), then runs every scenario at every concurrency level for
+`--duration` seconds and records throughput, latency percentiles and the
+number of calls the app made to Datadog. Results are written as JSON:
+
+    python -m bench.run --concurrency 1,10,50 --duration 10 --latency-ms 50
+    python -m bench.run --baseline bench/results/previous.json
+
+Use `--url` to load an app that is already running (outbound calls are then
+only counted if it points at a fake started with `python -m bench.fake_datadog`
+and `--fake-url` is given).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from bench.fake_datadog import add_arguments as add_fake_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+# (client, client number, iteration of that client) -> response
+Request = Callable[[httpx.AsyncClient, int, int], Awaitable[httpx.Response]]
+
+# Client numbers keep increasing across runs, so write scenarios never reuse an id
+CLIENTS = itertools.count()
+
+
+def _incident(i: int, now: datetime) -> dict:
+    created = now - timedelta(hours=7 * i)
+    resolved = i % 3 != 0
+    return {
+        "id": f"BENCH-{i:05d}",
+        "title": f"Benchmark incident {i}",
+        "status": "resolved" if resolved else "investigating",
+        "severity": ("minor", "major", "critical")[i % 3],
+        "created_at": created.isoformat(),
+        "resolved_at": (created + timedelta(hours=1)).isoformat() if resolved else None,
+        "affected_services": [f"Monitor {1 + i % 10}"],
+        "updates": [{"timestamp": created.isoformat(), "status": "investigating", "message": "Looking into it"}],
+    }
+
+
+def _write_incident(client: httpx.AsyncClient, worker: int, i: int) -> Awaitable[httpx.Response]:
+    """Each client creates, updates and deletes its own incidents in turn"""
+    incident_id = f"LOAD-{os.getpid()}-{worker}-{i // 3}"
+    step = i % 3
+    if step == 0:
+        incident = _incident(0, datetime.now())
+        incident.update(id=incident_id, title="Load test incident")
+        return client.post("/api/incidents", json=incident)
+    if step == 1:
+        return client.put(f"/api/incidents/{incident_id}", json={"status": "monitoring"})
+    return client.delete(f"/api/incidents/{incident_id}")
+
+
+# Scenario name -> request made by each iteration
+SCENARIOS: Dict[str, Request] = {
+    "status_page": lambda c, w, i: c.get("/"),
+    "monitors": lambda c, w, i: c.get("/api/monitors"),
+    "status": lambda c, w, i: c.get("/api/status"),
+    "incidents": lambda c, w, i: c.get("/api/incidents"),
+    "summary": lambda c, w, i: c.get("/api/summary"),
+    "crud_monitors_list": lambda c, w, i: c.get("/api/monitors/list"),
+    "crud_monitor_get": lambda c, w, i: c.get(f"/api/monitors/{1 + i % 10}"),
+    "crud_incidents_list": lambda c, w, i: c.get("/api/incidents/list"),
+    "crud_incident_get": lambda c, w, i: c.get(f"/api/incidents/BENCH-{i % 50:05d}"),
+    "crud_incident_write": _write_incident,
+}
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0, process: Optional[subprocess.Popen] = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _git_version() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Environment:
+    """Fake Datadog plus the app, each in its own process, with a throwaway data directory"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.directory = tempfile.mkdtemp(prefix="status-page-bench-")
+        self.processes: List[subprocess.Popen] = []
+        self.app_url = args.url
+        self.fake_url = args.fake_url
+
+    def _seed(self):
+        """Seed the app's storage directly, so startup doesn't import the repo's JSON files"""
+        sys.path.insert(0, ROOT)
+        from app.storage import SQLiteStorage
+
+        now = datetime.now()
+        monitors_file = os.path.join(self.directory, "monitors.json")
+        incidents_file = os.path.join(self.directory, "incidents.json")
+        with open(monitors_file, "w", encoding="utf-8") as f:
+            json.dump([
+                {"url_monitor": str(i), "nome_monitor": f"Monitor {i}", "descricao_monitor": "Benchmark monitor"}
+                for i in range(1, self.args.monitors + 1)
+            ], f)
+        with open(incidents_file, "w", encoding="utf-8") as f:
+            json.dump([_incident(i, now) for i in range(self.args.incidents)], f)
+        SQLiteStorage(os.path.join(self.directory, "status_page.db"), monitors_file, incidents_file)
+
+    def start(self):
+        if self.fake_url is None and self.app_url is None:
+            port = _free_port()
+            command = [
+                sys.executable, "-m", "bench.fake_datadog", "--port", str(port),
+                "--monitors", str(self.args.monitors),
+                "--latency-ms", str(self.args.latency_ms),
+                "--jitter-ms", str(self.args.jitter_ms),
+                "--error-rate", str(self.args.error_rate),
+                "--rate-limit-rate", str(self.args.rate_limit_rate),
+                "--rate-limit-reset", str(self.args.rate_limit_reset),
+                "--seed", str(self.args.seed),
+            ]
+            self.processes.append(subprocess.Popen(
+                command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ))
+            self.fake_url = f"http://127.0.0.1:{port}"
+            _wait_ready(f"{self.fake_url}/_stats", process=self.processes[-1])
+
+        if self.app_url is None:
+            self._seed()
+            port = _free_port()
+            # Every file the app writes goes to the data directory, which is also
+            # its working directory (so the repo's .env and JSON files aren't read)
+            env = dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+                DATADOG_API_HOST=self.fake_url,
+                DATADOG_API_KEY="bench",
+                DATADOG_APP_KEY="bench",
+                DATADOG_HTTP2="false",
+                STATUS_POLL_INTERVAL=str(self.args.poll_interval),
+                STORAGE_BACKEND="sqlite",
+                STORAGE_PATH=os.path.join(self.directory, "status_page.db"),
+                SHARED_STATE_PATH=os.path.join(self.directory, "shared_state.db"),
+                UPTIME_PATH=os.path.join(self.directory, "uptime.db"),
+                INCIDENT_SYNC_PATH=os.path.join(self.directory, "incident_sync.db"),
+                SNAPSHOT_PERSIST_PATH=os.path.join(self.directory, "status_snapshot.json"),
+                PROFILING_PATH=os.path.join(self.directory, "profiling.db"),
+                STATIC_PUBLISH_DIR="",
+            )
+            command = [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(self.args.workers), "--log-level", "warning",
+            ]
+            log = open(os.path.join(self.directory, "app.log"), "w")
+            self.processes.append(subprocess.Popen(command, cwd=self.directory, env=env, stdout=log, stderr=log))
+            self.app_url = f"http://127.0.0.1:{port}"
+            _wait_ready(f"{self.app_url}/api/status", timeout=60.0, process=self.processes[-1])
+
+    def outbound(self) -> Optional[Dict[str, Any]]:
+        if self.fake_url is None:
+            return None
+        return httpx.get(f"{self.fake_url}/_stats", timeout=5.0).json()
+
+    def reset_outbound(self):
+        if self.fake_url is not None:
+            httpx.post(f"{self.fake_url}/_reset", timeout=5.0)
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.args.keep_data:
+            print(f"Data directory kept at {self.directory}")
+        else:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+async def run_scenario(base_url: str, request: Request, concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """Run `concurrency` closed-loop clients for `duration` seconds after a warmup"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            nonlocal errors
+            number = next(CLIENTS)
+            for i in itertools.count():
+                now = time.perf_counter()
+                if now >= stop_at:
+                    return
+                try:
+                    response = await request(client, number, i)
+                    outcome = str(response.status_code)
+                    failed = response.status_code >= 500
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                    failed = True
+                end = time.perf_counter()
+                if now >= measure_from:
+                    latencies.append(end - now)
+                    statuses[outcome] = statuses.get(outcome, 0) + 1
+                    errors += failed
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    latencies.sort()
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print throughput and p95 changes against a previous results file"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    print(f"\nCompared with {baseline.get('version')} ({baseline.get('started_at')}):")
+    print(f"{'scenario':<22}{'conc':>5}{'rps':>10}{'Δrps':>9}{'p95 ms':>10}{'Δp95':>9}")
+    for result in results["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        rps, old_rps = result["throughput_rps"], old["throughput_rps"]
+        p95, old_p95 = result["latency_ms"]["p95"], old["latency_ms"]["p95"]
+        delta_rps = f"{100 * (rps - old_rps) / old_rps:+.0f}%" if old_rps else "-"
+        delta_p95 = f"{100 * (p95 - old_p95) / old_p95:+.0f}%" if p95 is not None and old_p95 else "-"
+        print(f"{result['scenario']:<22}{result['concurrency']:>5}{rps:>10}{delta_rps:>9}{p95 or '-':>10}{delta_p95:>9}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the status page API against a fake Datadog")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenario names")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per scenario and level")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before each run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="STATUS_POLL_INTERVAL of the app")
+    parser.add_argument("--incidents", type=int, default=200, help="Incidents seeded in storage")
+    parser.add_argument("--url", help="Benchmark an already running app instead of starting one")
+    parser.add_argument("--fake-url", help="Fake Datadog already running (for outbound call counts)")
+    parser.add_argument("--output", help="Results file (default: bench/results/<time>-<version>.json)")
+    parser.add_argument("--baseline", help="Previous results file to compare with")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the temporary data directory and app log")
+    add_fake_arguments(parser)
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    version = _git_version()
+    results: Dict[str, Any] = {
+        "version": version,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": [],
+    }
+
+    environment = Environment(args)
+    try:
+        environment.start()
+        print(f"Benchmarking {environment.app_url} (Datadog: {environment.fake_url or 'not counted'})")
+        print(f"{'scenario':<22}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'dd calls':>10}")
+        for name in names:
+            for concurrency in levels:
+                environment.reset_outbound()
+                result = asyncio.run(run_scenario(
+                    environment.app_url, SCENARIOS[name], concurrency, args.duration, args.warmup
+                ))
+                result = {"scenario": name, "concurrency": concurrency, **result, "outbound": environment.outbound()}
+                results["results"].append(result)
+                latency = result["latency_ms"]
+                calls = result["outbound"]["total"] if result["outbound"] else "-"
+                print(
+                    f"{name:<22}{concurrency:>5}{result['throughput_rps']:>10}{latency['p50'] or '-':>10}"
+                    f"{latency['p95'] or '-':>10}{latency['p99'] or '-':>10}{result['errors']:>8}{calls:>10}"
+                )
+    finally:
+        environment.stop()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{version or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import { useEffect, useState } from 'react'
 import { MonitorCard } from '@/components/MonitorCard'
 import { IncidentTimeline } from '@/components/IncidentTimeline'
 import { Badge } from '@/components/ui/badge'
-import type { Monitor, Incident, OverallStatus } from '@/types'
+import type { Monitor, MonitorUptime, Incident, OverallStatus, Summary, UptimeSummary } from '@/types'
 import { Activity, RefreshCw } from 'lucide-react'
 
 function App() {
@@ -11,35 +11,27 @@ function App() {
   const [overallStatus, setOverallStatus] = useState<OverallStatus | null>(null)
   const [loading, setLoading] = useState(true)
   const [lastUpdated, setLastUpdated] = useState<Date>(new Date())
+  const [live, setLive] = useState(false)
+  const [uptime, setUptime] = useState<Record<number, MonitorUptime>>({})
 
   const fetchData = async () => {
     try {
       console.log('Fetching status data...')
-      const [monitorsRes, incidentsRes, statusRes] = await Promise.all([
-        fetch('/api/monitors'),
-        fetch('/api/incidents'),
-        fetch('/api/status')
-      ])
-
-      console.log('Responses received:', {
-        monitors: monitorsRes.status,
-        incidents: incidentsRes.status,
-        status: statusRes.status
-      })
+      const summaryRes = await fetch('/api/summary')
+
+      console.log('Response received:', { summary: summaryRes.status })
 
-      const monitorsData = await monitorsRes.json()
-      const incidentsData = await incidentsRes.json()
-      const statusData = await statusRes.json()
+      const summaryData: Summary = await summaryRes.json()
 
       console.log('Data parsed:', {
-        monitors: monitorsData.monitors?.length,
-        incidents: incidentsData.incidents?.length,
-        status: statusData.status
+        monitors: summaryData.monitors?.length,
+        incidents: summaryData.incidents?.length,
+        status: summaryData.status?.status
       })
 
-      setMonitors(monitorsData.monitors || [])
-      setIncidents(incidentsData.incidents || [])
-      setOverallStatus(statusData)
+      setMonitors(summaryData.monitors || [])
+      setIncidents(summaryData.incidents || [])
+      setOverallStatus(summaryData.status)
       setLastUpdated(new Date())
       setLoading(false)
     } catch (error) {
@@ -49,12 +41,96 @@ function App() {
   }
 
   useEffect(() => {
-    fetchData()
+    // Daily uptime bars of every monitor in one (cached) request; they change slowly
+    const fetchUptime = async () => {
+      try {
+        const res = await fetch('/api/uptime?days=90')
+        if (!res.ok) return
+        const data: UptimeSummary = await res.json()
+        setUptime(Object.fromEntries(data.monitors.map((m) => [m.id, m])))
+      } catch (error) {
+        console.error('Failed to fetch uptime history:', error)
+      }
+    }
+    fetchUptime()
+    const interval = setInterval(fetchUptime, 300000)
+    return () => clearInterval(interval)
+  }, [])
 
-    // Auto-refresh every 60 seconds
-    const interval = setInterval(fetchData, 60000)
+  useEffect(() => {
+    // Live updates over Server-Sent Events; polling is only the fallback
+    if (typeof EventSource === 'undefined') {
+      fetchData()
+      const interval = setInterval(fetchData, 60000)
+      return () => clearInterval(interval)
+    }
 
-    return () => clearInterval(interval)
+    const source = new EventSource('/api/stream')
+    let interval: ReturnType<typeof setInterval> | null = null
+
+    const startPolling = () => {
+      if (interval === null) {
+        fetchData()
+        interval = setInterval(fetchData, 60000)
+      }
+    }
+    const stopPolling = () => {
+      if (interval !== null) {
+        clearInterval(interval)
+        interval = null
+      }
+    }
+
+    // Fall back to polling if the stream doesn't connect quickly
+    const fallback = setTimeout(startPolling, 5000)
+
+    const onEvent = <T,>(name: string, handler: (data: T) => void) => {
+      source.addEventListener(name, (event) => {
+        handler(JSON.parse((event as MessageEvent).data))
+        setLastUpdated(new Date())
+      })
+    }
+
+    onEvent<Summary>('snapshot', (data) => {
+      setMonitors(data.monitors)
+      setIncidents(data.incidents)
+      setOverallStatus(data.status)
+      setLoading(false)
+    })
+    onEvent<Monitor>('monitor', (monitor) => {
+      setMonitors((current) => current.some((m) => m.id === monitor.id)
+        ? current.map((m) => (m.id === monitor.id ? monitor : m))
+        : [...current, monitor])
+    })
+    onEvent<{ id: number }>('monitor_deleted', ({ id }) => {
+      setMonitors((current) => current.filter((m) => m.id !== id))
+    })
+    onEvent<OverallStatus>('status', setOverallStatus)
+    onEvent<Incident>('incident', (incident) => {
+      setIncidents((current) => current.some((i) => i.id === incident.id)
+        ? current.map((i) => (i.id === incident.id ? incident : i))
+        : [...current, incident])
+    })
+    onEvent<{ id: string }>('incident_deleted', ({ id }) => {
+      setIncidents((current) => current.filter((i) => i.id !== id))
+    })
+
+    source.onopen = () => {
+      clearTimeout(fallback)
+      stopPolling()
+      setLive(true)
+    }
+    source.onerror = () => {
+      // EventSource reconnects on its own; poll until it does
+      setLive(false)
+      startPolling()
+    }
+
+    return () => {
+      clearTimeout(fallback)
+      stopPolling()
+      source.close()
+    }
   }, [])
 
   const getOverallStatusConfig = (status: OverallStatus['status']) => {
@@ -143,7 +219,7 @@ function App() {
             <h2 className="text-2xl font-semibold mb-4">Services</h2>
             <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
               {monitors.map((monitor) => (
-                <MonitorCard key={monitor.id} monitor={monitor} />
+                <MonitorCard key={monitor.id} monitor={monitor} uptime={uptime[monitor.id]} />
               ))}
             </div>
           </section>
@@ -159,7 +235,7 @@ function App() {
       <footer className="border-t mt-12">
         <div className="container mx-auto px-4 py-6">
           <p className="text-sm text-muted-foreground text-center">
-            Powered by Datadog Monitors | Auto-refreshes every 60 seconds
+            Powered by Datadog Monitors | {live ? 'Live updates' : 'Auto-refreshes every 60 seconds'}
           </p>
         </div>
       </footer>
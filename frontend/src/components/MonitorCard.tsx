@@ -1,13 +1,15 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
-import type { Monitor } from "@/types"
+import { UptimeBars } from "@/components/UptimeBars"
+import type { Monitor, MonitorUptime } from "@/types"
 import { CheckCircle2, AlertCircle, AlertTriangle, HelpCircle, MinusCircle } from "lucide-react"
 
 interface MonitorCardProps {
   monitor: Monitor
+  uptime?: MonitorUptime
 }
 
-export function MonitorCard({ monitor }: MonitorCardProps) {
+export function MonitorCard({ monitor, uptime }: MonitorCardProps) {
   const getStatusConfig = (status: Monitor['status']) => {
     switch (status) {
       case 'OK':
@@ -48,6 +50,11 @@ export function MonitorCard({ monitor }: MonitorCardProps) {
     }
   }
 
+  const formatAge = (timestamp: string) => {
+    const minutes = Math.max(0, Math.round((Date.now() - new Date(timestamp).getTime()) / 60000))
+    return minutes < 1 ? 'less than a minute ago' : `${minutes} min ago`
+  }
+
   const config = getStatusConfig(monitor.status)
   const Icon = config.icon
 
@@ -62,6 +69,17 @@ export function MonitorCard({ monitor }: MonitorCardProps) {
       </CardHeader>
       <CardContent>
         <Badge variant={config.variant}>{config.text}</Badge>
+        {monitor.source === 'cached' && monitor.last_fetched_at && (
+          <p className="text-xs text-muted-foreground mt-2">
+            Last known status, checked {formatAge(monitor.last_fetched_at)}
+          </p>
+        )}
+        {monitor.source === 'error' && (
+          <p className="text-xs text-muted-foreground mt-2">
+            Status temporarily unavailable
+          </p>
+        )}
+        <UptimeBars history={uptime} />
       </CardContent>
     </Card>
   )
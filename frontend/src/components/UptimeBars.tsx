@@ -0,0 +1,51 @@
+import type { MonitorUptime, UptimeBucket } from "@/types"
+
+interface UptimeBarsProps {
+  history?: MonitorUptime
+  days?: number
+}
+
+export function UptimeBars({ history, days = 90 }: UptimeBarsProps) {
+  if (!history) {
+    return null
+  }
+
+  const getBarColor = (state: UptimeBucket['worst_state']) => {
+    switch (state) {
+      case 'OK':
+        return 'bg-green-500'
+      case 'Warn':
+        return 'bg-yellow-500'
+      case 'Alert':
+        return 'bg-red-500'
+      case 'No Data':
+        return 'bg-gray-200'
+    }
+  }
+
+  const formatTitle = (bucket: UptimeBucket) => {
+    const date = new Date(bucket.start).toLocaleDateString('en-US', { month: 'short', day: 'numeric' })
+    return bucket.uptime_percent === null ? `${date}: no data` : `${date}: ${bucket.uptime_percent.toFixed(2)}% uptime`
+  }
+
+  return (
+    <div className="mt-3 space-y-1">
+      <div className="flex h-6 gap-px">
+        {history.buckets.map((bucket) => (
+          <div
+            key={bucket.start}
+            className={`flex-1 rounded-sm ${getBarColor(bucket.worst_state)}`}
+            title={formatTitle(bucket)}
+          />
+        ))}
+      </div>
+      <div className="flex justify-between text-xs text-muted-foreground">
+        <span>{days} days ago</span>
+        <span>
+          {history.uptime_percent === null ? 'No data' : `${history.uptime_percent.toFixed(2)}% uptime`}
+        </span>
+        <span>Today</span>
+      </div>
+    </div>
+  )
+}
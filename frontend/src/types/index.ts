@@ -3,6 +3,10 @@ export interface Monitor {
   name: string
   description: string
   status: 'OK' | 'Alert' | 'Warn' | 'No Data' | 'Skipped'
+  // live: fetched just now; cached: last known state (Datadog unreachable); error: no state available
+  source?: 'live' | 'cached' | 'error'
+  error?: string | null
+  last_fetched_at?: string
 }
 
 export interface IncidentUpdate {
@@ -25,4 +29,39 @@ export interface Incident {
 export interface OverallStatus {
   status: 'operational' | 'partial_outage' | 'major_outage' | 'unknown'
   updated_at: string
+  snapshot_age_seconds?: number
+  stale_monitors?: number
+  failed_monitors?: number
+}
+
+export interface Summary {
+  monitors: Monitor[]
+  status: OverallStatus
+  incidents: Incident[]
+  updated_at?: string
+}
+
+export interface UptimeBucket {
+  start: string
+  uptime_percent: number | null
+  worst_state: 'OK' | 'Warn' | 'Alert' | 'No Data'
+  seconds: { ok: number, warn: number, alert: number, no_data: number }
+}
+
+export interface UptimeHistory {
+  resolution: 'day' | 'hour'
+  uptime_percent: number | null
+  buckets: UptimeBucket[]
+}
+
+export interface MonitorUptime {
+  id: number
+  uptime_percent: number | null
+  buckets: UptimeBucket[]
+}
+
+export interface UptimeSummary {
+  resolution: 'day' | 'hour'
+  days: number
+  monitors: MonitorUptime[]
 }
@@ -0,0 +1,22 @@
+"""
+gunicorn settings, loaded automatically from the working directory.
+
+Prepares the directory where every worker writes its Prometheus samples, so
+/metrics reports the whole server rather than the worker that answered.
+"""
+import os
+import shutil
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/status-page-metrics")
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to the new ones
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)